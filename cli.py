@@ -6,6 +6,7 @@ Command-line interface for the Y-DNA Propagator application.
 """
 
 import argparse
+import contextlib
 import csv
 import json
 import re
@@ -13,45 +14,97 @@ import sys
 from datetime import datetime
 from pathlib import Path
 
-from propagator import YDNAPropagator
-from database import Database
-from haplotree import Haplotree, print_comparison
+try:
+    import orjson
+
+    def _dumps(obj) -> str:
+        """Pretty-print JSON via orjson (much faster on large profiles)."""
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+except ImportError:
+    def _dumps(obj) -> str:
+        """Pretty-print JSON via the stdlib fallback."""
+        return json.dumps(obj, indent=2)
+
+# Compiled once; re.sub would re-consult the pattern cache on every call
+_FILENAME_CLEAN_RE = re.compile(r'[^\w\s-]')
+
+# Prebuilt table so the space substitution runs at C level via str.translate
+_FILENAME_SPACE_TRANS = str.maketrans({' ': '_'})
+
+# get_name results keyed by profile ID - the same profiles are formatted
+# repeatedly during traversal output
+_NAME_CACHE = {}
+
+# Shared gender marker lookup for per-profile print loops
+GENDER_MARK = {"male": "(M)"}
+
+# One timestamp per CLI invocation so batch callers don't hit the clock per file
+_RUN_TS = None
+
+
+def _run_timestamp() -> str:
+    global _RUN_TS
+    if _RUN_TS is None:
+        _RUN_TS = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return _RUN_TS
 
 
 def generate_tree_filename(profile: dict, prefix: str = "tree") -> str:
     """Generate unique filename based on profile name and ID."""
     name = get_name(profile)
     # Clean name for filename (remove special chars, replace spaces with underscore)
-    clean_name = re.sub(r'[^\w\s-]', '', name).strip().replace(' ', '_')
+    clean_name = _FILENAME_CLEAN_RE.sub('', name).strip().translate(_FILENAME_SPACE_TRANS)
 
     profile_id = profile.get("id") or profile.get("geni_id", "unknown")
-    # Extract just the numeric part if it's like "profile-15611"
+    # Extract just the numeric part if it's like "profile-15611" (slice off
+    # the known prefix instead of rescanning with replace)
     if profile_id.startswith("profile-"):
-        profile_id = profile_id.replace("profile-", "")
+        profile_id = profile_id[8:]
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-
-    return f"{prefix}_{clean_name}_{profile_id}_{timestamp}.csv"
+    return f"{prefix}_{clean_name}_{profile_id}_{_run_timestamp()}.csv"
 
 
 def get_name(profile: dict) -> str:
     """Get display name from profile, trying various fields."""
-    if profile.get("display_name"):
-        return profile["display_name"]
-    if profile.get("name"):
-        return profile["name"]
-    parts = []
-    if profile.get("first_name"):
-        parts.append(profile["first_name"])
-    if profile.get("last_name"):
-        parts.append(profile["last_name"])
-    if parts:
-        return " ".join(parts)
-    return "Unknown"
+    profile_id = profile.get("id") or profile.get("geni_id")
+    if profile_id is not None:
+        cached = _NAME_CACHE.get(profile_id)
+        if cached is not None:
+            return cached
+
+    name = profile.get("display_name") or profile.get("name")
+    if not name:
+        first = profile.get("first_name")
+        last = profile.get("last_name")
+        if first and last:
+            name = f"{first} {last}"
+        else:
+            name = first or last or "Unknown"
+
+    if profile_id is not None:
+        _NAME_CACHE[profile_id] = name
+    return name
+
+
+@contextlib.contextmanager
+def _authed_propagator(config_path):
+    """Yield an authenticated YDNAPropagator, closing it on exit."""
+    from propagator import YDNAPropagator
+
+    propagator = YDNAPropagator(config_path)
+    if not propagator.authenticate():
+        print("Authentication failed.")
+        raise SystemExit(1)
+    try:
+        yield propagator
+    finally:
+        propagator.close()
 
 
 def cmd_auth(args):
     """Authenticate with Geni API."""
+    from propagator import YDNAPropagator
+
     propagator = YDNAPropagator(args.config)
 
     if args.code:
@@ -65,264 +118,291 @@ def cmd_auth(args):
 
 def cmd_profile(args):
     """Fetch and display a profile."""
-    propagator = YDNAPropagator(args.config)
-
-    if not propagator.authenticate():
-        print("Authentication failed.")
-        return 1
-
-    profile = propagator.fetch_and_save_profile(args.profile_id)
-
-    if profile:
-        print(f"\nProfile: {profile.get('display_name', profile.get('name', 'Unknown'))}")
-        print(f"  ID: {profile.get('id', profile.get('geni_id'))}")
-        print(f"  Gender: {profile.get('gender', 'Unknown')}")
-
-        birth = profile.get("birth", {})
-        if birth:
-            print(f"  Birth: {birth.get('date', {}).get('formatted_date', 'Unknown')}")
-            if birth.get("location"):
-                print(f"  Birth place: {birth.get('location', {}).get('place_name', 'Unknown')}")
-
-        death = profile.get("death", {})
-        if death:
-            print(f"  Death: {death.get('date', {}).get('formatted_date', 'Unknown')}")
-
-        if args.json:
-            print(f"\nRaw JSON:\n{json.dumps(profile, indent=2)}")
-    else:
-        print(f"Profile {args.profile_id} not found.")
+    with _authed_propagator(args.config) as propagator:
+        profile = propagator.fetch_and_save_profile(args.profile_id)
+
+        if profile:
+            print(f"\nProfile: {profile.get('display_name', profile.get('name', 'Unknown'))}")
+            print(f"  ID: {profile.get('id', profile.get('geni_id'))}")
+            print(f"  Gender: {profile.get('gender', 'Unknown')}")
+
+            birth = profile.get("birth", {})
+            if birth:
+                print(f"  Birth: {birth.get('date', {}).get('formatted_date', 'Unknown')}")
+                if birth.get("location"):
+                    print(f"  Birth place: {birth.get('location', {}).get('place_name', 'Unknown')}")
+
+            death = profile.get("death", {})
+            if death:
+                print(f"  Death: {death.get('date', {}).get('formatted_date', 'Unknown')}")
+
+            if args.json:
+                print(f"\nRaw JSON:\n{_dumps(profile)}")
+        else:
+            print(f"Profile {args.profile_id} not found.")
 
-    propagator.close()
-    return 0
+        return 0
 
 
 def cmd_family(args):
     """Fetch and display immediate family."""
-    propagator = YDNAPropagator(args.config)
+    with _authed_propagator(args.config) as propagator:
+        family = propagator.fetch_immediate_family(args.profile_id)
 
-    if not propagator.authenticate():
-        print("Authentication failed.")
-        return 1
+        if family:
+            focus = family.get("focus", {})
 
-    family = propagator.fetch_immediate_family(args.profile_id)
+            # Assemble the whole report and write it once instead of one
+            # print() per family member
+            lines = [f"\nFamily of: {focus.get('display_name', focus.get('name', 'Unknown'))}"]
 
-    if family:
-        focus = family.get("focus", {})
-        print(f"\nFamily of: {focus.get('display_name', focus.get('name', 'Unknown'))}")
+            parents = family.get("parents", [])
+            if parents:
+                lines.append("\nParents:")
+                lines.extend(
+                    f"  {GENDER_MARK.get(p.get('gender'), '(F)')} {get_name(p)} - {p.get('id')}"
+                    for p in parents)
 
-        parents = family.get("parents", [])
-        if parents:
-            print("\nParents:")
-            for p in parents:
-                gender_marker = "(M)" if p.get("gender") == "male" else "(F)"
-                print(f"  {gender_marker} {get_name(p)} - {p.get('id')}")
+            partners = family.get("partners", [])
+            if partners:
+                lines.append("\nPartners:")
+                lines.extend(f"  {get_name(p)} - {p.get('id')}" for p in partners)
 
-        partners = family.get("partners", [])
-        if partners:
-            print("\nPartners:")
-            for p in partners:
-                print(f"  {get_name(p)} - {p.get('id')}")
+            children = family.get("children", [])
+            if children:
+                lines.append("\nChildren:")
+                lines.extend(
+                    f"  {GENDER_MARK.get(c.get('gender'), '(F)')} {get_name(c)} - {c.get('id')}"
+                    for c in children)
 
-        children = family.get("children", [])
-        if children:
-            print("\nChildren:")
-            for c in children:
-                gender_marker = "(M)" if c.get("gender") == "male" else "(F)"
-                print(f"  {gender_marker} {get_name(c)} - {c.get('id')}")
+            sys.stdout.write("\n".join(lines) + "\n")
 
-    propagator.close()
-    return 0
+        return 0
 
 
 def cmd_ancestors(args):
     """Traverse and display paternal ancestors."""
-    propagator = YDNAPropagator(args.config)
-
-    if not propagator.authenticate():
-        print("Authentication failed.")
-        return 1
-
-    ancestors = propagator.traverse_paternal_line_up(
-        args.profile_id,
-        max_generations=args.generations
-    )
+    with _authed_propagator(args.config) as propagator:
+        ancestors = propagator.traverse_paternal_line_up(
+            args.profile_id,
+            max_generations=args.generations
+        )
 
-    if ancestors:
-        print(f"\nFound {len(ancestors)} paternal ancestors")
+        if ancestors:
+            print(f"\nFound {len(ancestors)} paternal ancestors")
 
-        if args.export:
-            export_profiles_csv(ancestors, args.export)
-            print(f"Exported to {args.export}")
+            if args.export:
+                export_profiles_csv(ancestors, args.export)
+                print(f"Exported to {args.export}")
 
-    propagator.close()
-    return 0
+        return 0
 
 
 def cmd_descendants(args):
     """Traverse and display paternal descendants."""
-    propagator = YDNAPropagator(args.config)
-
-    if not propagator.authenticate():
-        print("Authentication failed.")
-        return 1
-
-    descendants = propagator.traverse_paternal_line_down(
-        args.profile_id,
-        max_generations=args.generations
-    )
-
-    if descendants:
-        print(f"\nFound {len(descendants)} paternal descendants")
-
+    with _authed_propagator(args.config) as propagator:
         if args.export:
-            profiles = [d["profile"] for d in descendants]
-            export_profiles_csv(profiles, args.export)
+            # Stream profiles straight from the traversal into the CSV
+            # writer - no descendant list, no second profile-only copy
+            count = export_profiles_csv(
+                propagator.traverse_paternal_line_down_iter(
+                    args.profile_id, max_generations=args.generations),
+                args.export)
+            print(f"\nFound {count} paternal descendants")
             print(f"Exported to {args.export}")
+            return 0
 
-    propagator.close()
-    return 0
+        descendants = propagator.traverse_paternal_line_down(
+            args.profile_id,
+            max_generations=args.generations
+        )
 
+        if descendants:
+            print(f"\nFound {len(descendants)} paternal descendants")
 
-def cmd_propagate(args):
-    """Propagate a haplogroup along paternal lines."""
-    propagator = YDNAPropagator(args.config)
+        return 0
 
-    if not propagator.authenticate():
-        print("Authentication failed.")
-        return 1
 
-    stats = propagator.propagate_haplogroup(
-        args.profile_id,
-        args.haplogroup,
-        source=args.source,
-        propagate_up=not args.down_only,
-        propagate_down=not args.up_only
-    )
+def cmd_propagate(args):
+    """Propagate a haplogroup along paternal lines."""
+    with _authed_propagator(args.config) as propagator:
+        stats = propagator.propagate_haplogroup(
+            args.profile_id,
+            args.haplogroup,
+            source=args.source,
+            propagate_up=not args.down_only,
+            propagate_down=not args.up_only
+        )
 
-    if args.export:
-        # Export all profiles with this haplogroup
-        profiles = propagator.db.get_profiles_by_haplogroup(args.haplogroup)
-        export_profiles_csv(profiles, args.export)
-        print(f"Exported {len(profiles)} profiles to {args.export}")
+        if args.export:
+            # Export all profiles with this haplogroup, streamed from the DB cursor
+            count = export_profiles_csv(
+                propagator.db.iter_profiles_by_haplogroup(args.haplogroup), args.export)
+            print(f"Exported {count} profiles to {args.export}")
 
-    propagator.close()
-    return 0
+        return 0
 
 
 def cmd_full_tree(args):
     """Propagate haplogroup from oldest ancestor to ALL descendants."""
-    propagator = YDNAPropagator(args.config)
-
-    if not propagator.authenticate():
-        print("Authentication failed.")
-        return 1
-
-    stats = propagator.propagate_full_tree(
-        args.profile_id,
-        args.haplogroup,
-        source=args.source,
-        resume=args.resume
-    )
-
-    # Always export - generate unique filename if not specified
-    profiles = propagator.db.get_profiles_by_haplogroup(args.haplogroup)
+    with _authed_propagator(args.config) as propagator:
+        stats = propagator.propagate_full_tree(
+            args.profile_id,
+            args.haplogroup,
+            source=args.source,
+            resume=args.resume,
+            refresh_days=args.refresh_days
+        )
 
-    if args.export:
-        export_file = args.export
-    else:
-        # Auto-generate filename from root ancestor
-        root_profile = propagator.db.get_profile(stats["root_profile_id"])
-        if root_profile:
-            export_file = generate_tree_filename(root_profile, prefix=f"tree_{args.haplogroup}")
+        if args.no_export:
+            # Skip the haplogroup query and CSV write entirely
+            return 0
+
+        db = propagator.db
+
+        # Resume runs against an existing export file only append rows added
+        # since the last checkpoint instead of re-serializing the whole set.
+        # A zero checkpoint means we never exported this haplogroup (the
+        # file predates the checkpoint table or was made by hand), so
+        # appending would duplicate every existing row - rewrite instead.
+        if args.resume and args.export and Path(args.export).exists():
+            last_rowid = db.get_export_checkpoint(args.haplogroup)
+            if last_rowid:
+                ceiling = db.get_max_haplogroup_rowid(args.haplogroup)
+                count = export_profiles_csv(
+                    db.iter_profiles_by_haplogroup_since(args.haplogroup, last_rowid),
+                    args.export, append=True)
+                db.set_export_checkpoint(args.haplogroup, ceiling)
+                print(f"Appended {count} new profiles to {args.export}")
+                return 0
+
+        # Export by default - generate unique filename if not specified
+        if args.export:
+            export_file = args.export
         else:
-            export_file = f"tree_{args.haplogroup}_{stats['root_profile_id']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            # Auto-generate filename from root ancestor
+            root_profile = db.get_profile(stats["root_profile_id"])
+            if root_profile:
+                export_file = generate_tree_filename(root_profile, prefix=f"tree_{args.haplogroup}")
+            else:
+                export_file = f"tree_{args.haplogroup}_{stats['root_profile_id']}_{_run_timestamp()}.csv"
 
-    export_profiles_csv(profiles, export_file)
-    print(f"Exported {len(profiles)} profiles to {export_file}")
+        ceiling = db.get_max_haplogroup_rowid(args.haplogroup)
+        count = export_profiles_csv(
+            db.iter_profiles_by_haplogroup(args.haplogroup), export_file)
+        db.set_export_checkpoint(args.haplogroup, ceiling)
+        print(f"Exported {count} profiles to {export_file}")
 
-    propagator.close()
-    return 0
+        return 0
 
 
 def cmd_import_haplogroups(args):
     """Import haplogroups from a CSV file."""
-    propagator = YDNAPropagator(args.config)
+    with _authed_propagator(args.config) as propagator:
+        # Collect valid rows first so the haplogroups can be inserted in one
+        # transaction instead of one commit per row. Positional csv.reader with a
+        # header-index map skips DictReader's per-row dict allocation.
+        rows = []
+        with open(args.csv_file, "r", newline="", encoding="utf-8", buffering=1024 * 1024) as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                print(f"Empty CSV file: {args.csv_file}")
+                return 1
 
-    if not propagator.authenticate():
-        print("Authentication failed.")
-        return 1
+            idx = {name: i for i, name in enumerate(header)}
+            pid_i = idx.get("geni_profile_id", idx.get("profile_id"))
+            hg_i = idx.get("haplogroup")
+            src_i = idx.get("source")
+            if pid_i is None or hg_i is None:
+                print("CSV must have profile_id (or geni_profile_id) and haplogroup columns.")
+                return 1
 
-    with open(args.csv_file, "r") as f:
-        reader = csv.DictReader(f)
-        count = 0
-
-        for row in reader:
-            profile_id = row.get("geni_profile_id") or row.get("profile_id")
-            haplogroup = row.get("haplogroup")
-            source = row.get("source", "imported")
-
-            if profile_id and haplogroup:
-                # Fetch the profile first
-                propagator.fetch_and_save_profile(profile_id)
-
-                # Add the haplogroup
-                propagator.db.add_haplogroup(
-                    profile_id,
-                    haplogroup,
-                    source,
-                    is_tested=True,
-                    confidence="confirmed"
-                )
-                count += 1
-                print(f"Imported: {profile_id} = {haplogroup}")
-
-    print(f"\nImported {count} haplogroups")
-    propagator.close()
-    return 0
+            # Haplogroup/source columns have a handful of distinct values
+            # across millions of rows; interning collapses the duplicates to
+            # one string object each instead of a fresh allocation per row
+            intern = sys.intern
+            for row in reader:
+                if len(row) <= max(pid_i, hg_i):
+                    continue
+                profile_id = row[pid_i]
+                haplogroup = row[hg_i]
+                if not (profile_id and haplogroup):
+                    continue
+                source = row[src_i] if src_i is not None and src_i < len(row) and row[src_i] else "imported"
+                rows.append((profile_id, intern(haplogroup), intern(source)))
+
+        # Fetch missing profiles concurrently - the HTTP round-trips are
+        # independent and latency-bound. Workers only do network calls; all
+        # database writes happen on this thread because the SQLite connection
+        # is bound to it.
+        to_fetch = [pid for pid, _, _ in rows if not propagator.db.get_profile(pid)]
+
+        if to_fetch:
+            from concurrent.futures import ThreadPoolExecutor, as_completed
+
+            with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                futures = {
+                    executor.submit(propagator.client.get_profile, pid): pid
+                    for pid in to_fetch
+                }
+                for future in as_completed(futures):
+                    pid = futures[future]
+                    try:
+                        propagator.db.save_profile(future.result())
+                    except Exception as e:
+                        print(f"  Error fetching profile {pid}: {e}")
+
+        # Buffer progress lines and flush periodically rather than paying a
+        # stdout write per row
+        progress = []
+        for i, (profile_id, haplogroup, _) in enumerate(rows, 1):
+            progress.append(f"Imported: {profile_id} = {haplogroup}")
+            if len(progress) >= 100 or i == len(rows):
+                sys.stdout.write("\n".join(progress) + "\n")
+                progress.clear()
+
+        if rows:
+            propagator.db.add_haplogroups_bulk(rows, is_tested=True, confidence="confirmed")
+
+        print(f"\nImported {len(rows)} haplogroups")
+        return 0
 
 
 def cmd_build_tree(args):
     """Build a complete paternal tree."""
-    propagator = YDNAPropagator(args.config)
-
-    if not propagator.authenticate():
-        print("Authentication failed.")
-        return 1
-
-    tree = propagator.build_paternal_tree(
-        args.profile_id,
-        haplogroup=args.haplogroup,
-        tree_name=args.name
-    )
-
-    print(f"\nTree built:")
-    print(f"  Name: {tree['tree_name']}")
-    print(f"  Root: {tree['root_profile_id']}")
-    print(f"  Ancestors: {tree['total_ancestors']}")
-    print(f"  Descendants: {tree['total_descendants']}")
-
-    if args.export:
-        # Export all profiles in the tree
-        profiles = []
+    with _authed_propagator(args.config) as propagator:
+        tree = propagator.build_paternal_tree(
+            args.profile_id,
+            haplogroup=args.haplogroup,
+            tree_name=args.name
+        )
 
-        # Get root and ancestors
-        root = propagator.db.get_profile(tree['root_profile_id'])
-        if root:
-            profiles.append(root)
+        print(f"\nTree built:")
+        print(f"  Name: {tree['tree_name']}")
+        print(f"  Root: {tree['root_profile_id']}")
+        print(f"  Ancestors: {tree['total_ancestors']}")
+        print(f"  Descendants: {tree['total_descendants']}")
 
-        descendants = propagator.db.get_paternal_descendants(tree['root_profile_id'])
-        profiles.extend([d["profile"] for d in descendants])
+        if args.export:
+            # Export all profiles in the tree, streaming root then descendants
+            def tree_profiles():
+                root = propagator.db.get_profile(tree['root_profile_id'])
+                if root:
+                    yield root
+                for d in propagator.db.get_paternal_descendants(tree['root_profile_id']):
+                    yield d["profile"]
 
-        export_profiles_csv(profiles, args.export)
-        print(f"Exported {len(profiles)} profiles to {args.export}")
+            count = export_profiles_csv(tree_profiles(), args.export)
+            print(f"Exported {count} profiles to {args.export}")
 
-    propagator.close()
-    return 0
+        return 0
 
 
 def cmd_stats(args):
     """Display database statistics."""
+    from database import Database
+
     db = Database(args.database)
     stats = db.get_statistics()
 
@@ -341,40 +421,36 @@ def cmd_stats(args):
 
 def cmd_search(args):
     """Search for profiles."""
-    propagator = YDNAPropagator(args.config)
-
-    if not propagator.authenticate():
-        print("Authentication failed.")
-        return 1
-
-    results = propagator.client.search_profiles(names=args.name)
-
-    if "results" in results:
-        profiles = results["results"]
-        print(f"\nFound {len(profiles)} profiles:")
-        for p in profiles:
-            gender_marker = "(M)" if p.get("gender") == "male" else "(F)"
-            birth = p.get("birth", {})
-            birth_year = ""
-            if birth and birth.get("date"):
-                birth_year = f" b.{birth['date'].get('year', '?')}"
-            print(f"  {gender_marker} {p.get('name', 'Unknown')}{birth_year} - {p.get('id')}")
-    else:
-        print("No results found.")
+    with _authed_propagator(args.config) as propagator:
+        results = propagator.client.search_profiles(names=args.name)
+
+        if "results" in results:
+            profiles = results["results"]
+            print(f"\nFound {len(profiles)} profiles:")
+            for p in profiles:
+                gender_marker = GENDER_MARK.get(p.get("gender"), "(F)")
+                birth = p.get("birth", {})
+                birth_year = ""
+                if birth and birth.get("date"):
+                    birth_year = f" b.{birth['date'].get('year', '?')}"
+                print(f"  {gender_marker} {p.get('name', 'Unknown')}{birth_year} - {p.get('id')}")
+        else:
+            print("No results found.")
 
-    propagator.close()
-    return 0
+        return 0
 
 
 def cmd_export(args):
     """Export profiles with a specific haplogroup."""
+    from database import Database
+
     db = Database(args.database)
 
-    profiles = db.get_profiles_by_haplogroup(args.haplogroup)
+    count = export_profiles_csv(
+        db.iter_profiles_by_haplogroup(args.haplogroup), args.output)
 
-    if profiles:
-        export_profiles_csv(profiles, args.output)
-        print(f"Exported {len(profiles)} profiles to {args.output}")
+    if count:
+        print(f"Exported {count} profiles to {args.output}")
     else:
         print(f"No profiles found with haplogroup {args.haplogroup}")
 
@@ -384,6 +460,8 @@ def cmd_export(args):
 
 def cmd_compare(args):
     """Compare two haplogroups to find their relationship."""
+    from haplotree import Haplotree, print_comparison
+
     tree = Haplotree(args.haplotree)
     print_comparison(args.haplogroup1, args.haplogroup2, tree)
     return 0
@@ -391,6 +469,8 @@ def cmd_compare(args):
 
 def cmd_haplotree_info(args):
     """Show information about a haplogroup from the FTDNA haplotree."""
+    from haplotree import Haplotree, print_comparison
+
     tree = Haplotree(args.haplotree)
 
     node = tree.find_by_name(args.haplogroup)
@@ -406,13 +486,13 @@ def cmd_haplotree_info(args):
     print(f"  Sub-branches: {node.get('subBranches', 0)}")
     print(f"  BigY count: {node.get('bigYCount', 0)}")
 
-    # Get ancestry path
-    path = tree.get_ancestry_path(args.haplogroup)
-    print(f"\nAncestry ({len(path)} levels):")
-    for i, (_, name) in enumerate(path[:20]):
+    # Get ancestry path (only the 20 shown levels are materialized)
+    path, depth = tree.get_ancestry_path_truncated(args.haplogroup, 20)
+    print(f"\nAncestry ({depth} levels):")
+    for i, (_, name) in enumerate(path):
         print(f"  {i}: {name}")
-    if len(path) > 20:
-        print(f"  ... ({len(path) - 20} more)")
+    if depth > 20:
+        print(f"  ... ({depth - 20} more)")
 
     # Show defining SNPs
     variants = node.get('variants', [])
@@ -428,6 +508,8 @@ def cmd_haplotree_info(args):
 
 def cmd_tree_overlaps(args):
     """Show overlapping profiles between haplogroup trees."""
+    from database import Database
+
     db = Database(args.database)
 
     if args.haplogroup1 and args.haplogroup2:
@@ -485,120 +567,126 @@ def cmd_import_project(args):
     import requests
     import time
 
-    propagator = YDNAPropagator(args.config)
+    with _authed_propagator(args.config) as propagator:
+        # Get project profiles
+        project_id = args.project_id
+        haplogroup = args.haplogroup
 
-    if not propagator.authenticate():
-        print("Authentication failed.")
-        return 1
-
-    # Get project profiles
-    project_id = args.project_id
-    haplogroup = args.haplogroup
-
-    print(f"\n{'='*60}")
-    print(f"Importing from Geni project: {project_id}")
-    print(f"Haplogroup: {haplogroup}")
-    print(f"{'='*60}\n")
+        print(f"\n{'='*60}")
+        print(f"Importing from Geni project: {project_id}")
+        print(f"Haplogroup: {haplogroup}")
+        print(f"{'='*60}\n")
 
-    # Fetch project info first
-    token = propagator.client.access_token
+        # Fetch project info first
+        token = propagator.client.access_token
 
-    try:
-        response = requests.get(
-            f'https://www.geni.com/api/project-{project_id}',
-            params={'access_token': token}
-        )
-        if response.status_code == 200:
-            project_info = response.json()
-            print(f"Project: {project_info.get('name', 'Unknown')}")
-        else:
-            print(f"Warning: Could not fetch project info (status {response.status_code})")
-    except Exception as e:
-        print(f"Warning: Could not fetch project info: {e}")
+        try:
+            response = requests.get(
+                f'https://www.geni.com/api/project-{project_id}',
+                params={'access_token': token}
+            )
+            if response.status_code == 200:
+                project_info = response.json()
+                print(f"Project: {project_info.get('name', 'Unknown')}")
+            else:
+                print(f"Warning: Could not fetch project info (status {response.status_code})")
+        except Exception as e:
+            print(f"Warning: Could not fetch project info: {e}")
 
-    # Fetch all project profiles using next_page URL
-    all_profiles = []
-    next_url = f'https://www.geni.com/api/project-{project_id}/profiles'
-    page = 0
+        # Fetch all project profiles using next_page URL
+        all_profiles = []
+        next_url = f'https://www.geni.com/api/project-{project_id}/profiles'
+        page = 0
 
-    while next_url:
-        try:
-            time.sleep(3)  # Rate limiting
+        while next_url:
+            try:
+                time.sleep(3)  # Rate limiting
 
-            # Use next_url directly if it contains access_token, otherwise add it
-            if 'access_token=' in next_url:
-                response = requests.get(next_url)
-            else:
-                response = requests.get(next_url, params={'access_token': token})
+                # Use next_url directly if it contains access_token, otherwise add it
+                if 'access_token=' in next_url:
+                    response = requests.get(next_url)
+                else:
+                    response = requests.get(next_url, params={'access_token': token})
 
-            if response.status_code == 429:
-                print("  Rate limited, waiting 15s...")
-                time.sleep(15)
-                continue
+                if response.status_code == 429:
+                    print("  Rate limited, waiting 15s...")
+                    time.sleep(15)
+                    continue
 
-            if response.status_code != 200:
-                print(f"Error fetching profiles: {response.status_code}")
-                break
+                if response.status_code != 200:
+                    print(f"Error fetching profiles: {response.status_code}")
+                    break
 
-            data = response.json()
-            profiles = data.get('results', [])
+                data = response.json()
+                profiles = data.get('results', [])
 
-            if not profiles:
-                break
+                if not profiles:
+                    break
 
-            all_profiles.extend(profiles)
-            page = data.get('page', page + 1)
-            print(f"  Fetched page {page}: {len(profiles)} profiles (total: {len(all_profiles)})")
+                all_profiles.extend(profiles)
+                page = data.get('page', page + 1)
+                print(f"  Fetched page {page}: {len(profiles)} profiles (total: {len(all_profiles)})")
 
-            # Get next page URL from response
-            next_url = data.get('next_page')
+                # Get next page URL from response
+                next_url = data.get('next_page')
 
-        except Exception as e:
-            print(f"Error: {e}")
-            break
+            except Exception as e:
+                print(f"Error: {e}")
+                break
 
-    print(f"\nFound {len(all_profiles)} profiles in project")
+        print(f"\nFound {len(all_profiles)} profiles in project")
 
-    # Check which profiles we already have
-    existing_count = 0
-    new_profiles = []
+        # Check which profiles we already have
+        existing_count = 0
+        new_profiles = []
 
-    for p in all_profiles:
-        profile_id = p.get('id')
-        if profile_id:
-            existing = propagator.db.get_haplogroup(profile_id)
-            if existing and any(h.get('haplogroup') == haplogroup for h in [existing] if isinstance(existing, dict)):
-                existing_count += 1
-            else:
-                new_profiles.append(p)
+        for p in all_profiles:
+            profile_id = p.get('id')
+            if profile_id:
+                existing = propagator.db.get_haplogroup(profile_id)
+                if existing and any(h.get('haplogroup') == haplogroup for h in [existing] if isinstance(existing, dict)):
+                    existing_count += 1
+                else:
+                    new_profiles.append(p)
 
-    print(f"Already in database with {haplogroup}: {existing_count}")
-    print(f"New profiles to process: {len(new_profiles)}")
+        print(f"Already in database with {haplogroup}: {existing_count}")
+        print(f"New profiles to process: {len(new_profiles)}")
 
-    if not new_profiles:
-        print("\nNo new profiles to import.")
-        propagator.close()
-        return 0
+        if not new_profiles:
+            print("\nNo new profiles to import.")
+            return 0
 
-    # Import new profiles
-    imported = 0
-    propagate_sources = []
+        # Import new profiles
+        imported = 0
+        propagate_sources = []
 
-    for p in new_profiles:
-        profile_id = p.get('id')
-        name = p.get('name', 'Unknown')
-        is_public = p.get('public', False)
+        for p in new_profiles:
+            profile_id = p.get('id')
+            name = p.get('name', 'Unknown')
+            is_public = p.get('public', False)
 
-        if not profile_id:
-            continue
+            if not profile_id:
+                continue
 
-        # Save profile to database
-        try:
-            # Fetch full profile data if public
-            if is_public:
-                time.sleep(2)
-                full_profile = propagator.fetch_and_save_profile(profile_id)
-                if full_profile:
+            # Save profile to database
+            try:
+                # Fetch full profile data if public
+                if is_public:
+                    time.sleep(2)
+                    full_profile = propagator.fetch_and_save_profile(profile_id)
+                    if full_profile:
+                        propagator.db.add_haplogroup(
+                            profile_id,
+                            haplogroup,
+                            "project_import",
+                            is_tested=True,
+                            confidence="confirmed"
+                        )
+                        imported += 1
+                        propagate_sources.append(profile_id)
+                        print(f"  Imported: {name} ({profile_id})")
+                else:
+                    # For private profiles, just add haplogroup without full data
                     propagator.db.add_haplogroup(
                         profile_id,
                         haplogroup,
@@ -607,53 +695,42 @@ def cmd_import_project(args):
                         confidence="confirmed"
                     )
                     imported += 1
-                    propagate_sources.append(profile_id)
-                    print(f"  Imported: {name} ({profile_id})")
-            else:
-                # For private profiles, just add haplogroup without full data
-                propagator.db.add_haplogroup(
-                    profile_id,
-                    haplogroup,
-                    "project_import",
-                    is_tested=True,
-                    confidence="confirmed"
-                )
-                imported += 1
-                print(f"  Added (private): {name} ({profile_id})")
+                    print(f"  Added (private): {name} ({profile_id})")
 
-        except Exception as e:
-            print(f"  Error importing {profile_id}: {e}")
+            except Exception as e:
+                print(f"  Error importing {profile_id}: {e}")
 
-    print(f"\nImported {imported} profiles")
+        print(f"\nImported {imported} profiles")
 
-    # Optionally propagate from new profiles
-    if args.propagate and propagate_sources:
-        print(f"\n{'='*60}")
-        print(f"Propagating from {len(propagate_sources)} new profiles...")
-        print(f"{'='*60}\n")
+        # Optionally propagate from new profiles
+        if args.propagate and propagate_sources:
+            print(f"\n{'='*60}")
+            print(f"Propagating from {len(propagate_sources)} new profiles...")
+            print(f"{'='*60}\n")
 
-        for profile_id in propagate_sources[:args.max_propagate]:
-            print(f"\nPropagating from {profile_id}...")
-            try:
-                stats = propagator.propagate_full_tree(
-                    profile_id,
-                    haplogroup,
-                    source="propagated_project"
-                )
-                print(f"  Added {stats.get('total_propagated', 0)} profiles")
-            except Exception as e:
-                print(f"  Error: {e}")
+            for profile_id in propagate_sources[:args.max_propagate]:
+                print(f"\nPropagating from {profile_id}...")
+                try:
+                    stats = propagator.propagate_full_tree(
+                        profile_id,
+                        haplogroup,
+                        source="propagated_project"
+                    )
+                    print(f"  Added {stats.get('total_propagated', 0)} profiles")
+                except Exception as e:
+                    print(f"  Error: {e}")
 
-    # Export results
-    profiles = propagator.db.get_profiles_by_haplogroup(haplogroup)
-    print(f"\nTotal profiles with {haplogroup}: {len(profiles)}")
+        # Export results
+        profiles = propagator.db.get_profiles_by_haplogroup(haplogroup)
+        print(f"\nTotal profiles with {haplogroup}: {len(profiles)}")
 
-    propagator.close()
-    return 0
+        return 0
 
 
 def cmd_tree_members(args):
     """List members of a haplogroup tree."""
+    from database import Database
+
     db = Database(args.database)
 
     members = db.get_tree_members(args.haplogroup)
@@ -684,78 +761,88 @@ def cmd_tree_members(args):
     return 0
 
 
-def export_profiles_csv(profiles: list, filename: str):
-    """Export profiles to CSV file."""
-    if not profiles:
-        return
+EXPORT_FIELDNAMES = (
+    "geni_id", "display_name", "first_name", "last_name",
+    "gender", "birth_date", "birth_place", "death_date", "death_place",
+    "haplogroup", "haplogroup_source"
+)
 
-    fieldnames = [
-        "geni_id", "display_name", "first_name", "last_name",
-        "gender", "birth_date", "birth_place", "death_date", "death_place",
-        "haplogroup", "haplogroup_source"
-    ]
+# Columns copied straight from the profile dict (no fallback logic)
+_EXPORT_PLAIN_FIELDS = EXPORT_FIELDNAMES[2:]
 
-    with open(filename, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
-        writer.writeheader()
 
-        for p in profiles:
-            row = {
-                "geni_id": p.get("geni_id") or p.get("id"),
-                "display_name": p.get("display_name") or p.get("name"),
-                "first_name": p.get("first_name"),
-                "last_name": p.get("last_name"),
-                "gender": p.get("gender"),
-                "birth_date": p.get("birth_date"),
-                "birth_place": p.get("birth_place"),
-                "death_date": p.get("death_date"),
-                "death_place": p.get("death_place"),
-                "haplogroup": p.get("haplogroup"),
-                "haplogroup_source": p.get("haplogroup_source")
-            }
-            writer.writerow(row)
+def export_profiles_csv(profiles, filename: str, append: bool = False) -> int:
+    """
+    Export profiles to CSV file.
 
+    Accepts any iterable of profile dicts (list or generator) so callers can
+    stream rows straight from a DB cursor. Returns the number of rows written.
+    With append=True the file is extended and the header is not rewritten.
+    """
+    count = 0
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Y-DNA Propagator - Extend Y-DNA propagation along paternal lines using Geni.com data"
-    )
-    parser.add_argument("--config", default="config.json", help="Path to config file")
-    parser.add_argument("--database", default="ydna_propagator.db", help="Path to database file")
-
-    subparsers = parser.add_subparsers(dest="command", help="Available commands")
-
-    # Auth command
+    def rows():
+        nonlocal count
+        for p in profiles:
+            count += 1
+            get = p.get
+            yield (
+                get("geni_id") or get("id"),
+                get("display_name") or get("name"),
+                *map(get, _EXPORT_PLAIN_FIELDS)
+            )
+
+    # Large write buffer so rows are flushed in MB-sized chunks instead of
+    # one write() per 8 KiB of output
+    mode = "a" if append else "w"
+    with open(filename, mode, newline="", encoding="utf-8", buffering=1024 * 1024) as f:
+        # Positional writer: tuples avoid DictWriter's per-row fieldname lookups
+        writer = csv.writer(f)
+        if not append:
+            writer.writerow(EXPORT_FIELDNAMES)
+
+        # Build rows lazily and let writerows drive the loop in C
+        writer.writerows(rows())
+
+    return count
+
+
+def _add_auth_parser(subparsers):
     auth_parser = subparsers.add_parser("auth", help="Authenticate with Geni API")
     auth_parser.add_argument("--code", help="Authorization code (if already obtained)")
     auth_parser.set_defaults(func=cmd_auth)
 
-    # Profile command
+
+def _add_profile_parser(subparsers):
     profile_parser = subparsers.add_parser("profile", help="Fetch and display a profile")
     profile_parser.add_argument("profile_id", help="Geni profile ID")
     profile_parser.add_argument("--json", action="store_true", help="Show raw JSON")
     profile_parser.set_defaults(func=cmd_profile)
 
-    # Family command
+
+def _add_family_parser(subparsers):
     family_parser = subparsers.add_parser("family", help="Fetch and display immediate family")
     family_parser.add_argument("profile_id", help="Geni profile ID")
     family_parser.set_defaults(func=cmd_family)
 
-    # Ancestors command
+
+def _add_ancestors_parser(subparsers):
     ancestors_parser = subparsers.add_parser("ancestors", help="Traverse paternal ancestors")
     ancestors_parser.add_argument("profile_id", help="Starting profile ID")
     ancestors_parser.add_argument("--generations", "-g", type=int, default=50, help="Max generations")
     ancestors_parser.add_argument("--export", "-e", help="Export to CSV file")
     ancestors_parser.set_defaults(func=cmd_ancestors)
 
-    # Descendants command
+
+def _add_descendants_parser(subparsers):
     descendants_parser = subparsers.add_parser("descendants", help="Traverse paternal descendants")
     descendants_parser.add_argument("profile_id", help="Starting profile ID")
     descendants_parser.add_argument("--generations", "-g", type=int, default=50, help="Max generations")
     descendants_parser.add_argument("--export", "-e", help="Export to CSV file")
     descendants_parser.set_defaults(func=cmd_descendants)
 
-    # Propagate command
+
+def _add_propagate_parser(subparsers):
     propagate_parser = subparsers.add_parser("propagate", help="Propagate haplogroup along paternal lines")
     propagate_parser.add_argument("profile_id", help="Source profile with known haplogroup")
     propagate_parser.add_argument("haplogroup", help="Y-DNA haplogroup (e.g., R-M269)")
@@ -765,21 +852,28 @@ def main():
     propagate_parser.add_argument("--export", "-e", help="Export results to CSV file")
     propagate_parser.set_defaults(func=cmd_propagate)
 
-    # Full tree propagation command
+
+def _add_full_tree_parser(subparsers):
     fulltree_parser = subparsers.add_parser("full-tree", help="Propagate from oldest ancestor to ALL descendants")
     fulltree_parser.add_argument("profile_id", help="Any profile in the paternal line")
     fulltree_parser.add_argument("haplogroup", help="Y-DNA haplogroup (e.g., R-M269)")
     fulltree_parser.add_argument("--source", "-s", default="FTDNA", help="Source of haplogroup data")
     fulltree_parser.add_argument("--resume", "-r", action="store_true", help="Resume interrupted propagation")
     fulltree_parser.add_argument("--export", "-e", help="Export results to CSV file")
+    fulltree_parser.add_argument("--no-export", action="store_true", help="Skip the CSV export step")
+    fulltree_parser.add_argument("--refresh-days", type=float, default=None,
+                                 help="Serve families fetched within this many days from the local DB (0 always re-downloads)")
     fulltree_parser.set_defaults(func=cmd_full_tree)
 
-    # Import haplogroups command
+
+def _add_import_parser(subparsers):
     import_parser = subparsers.add_parser("import", help="Import haplogroups from CSV")
     import_parser.add_argument("csv_file", help="CSV file with profile_id,haplogroup,source columns")
+    import_parser.add_argument("--workers", "-w", type=int, default=8, help="Concurrent profile fetches (default: 8)")
     import_parser.set_defaults(func=cmd_import_haplogroups)
 
-    # Build tree command
+
+def _add_tree_parser(subparsers):
     tree_parser = subparsers.add_parser("tree", help="Build a complete paternal tree")
     tree_parser.add_argument("profile_id", help="Starting profile ID")
     tree_parser.add_argument("--haplogroup", help="Haplogroup for the tree")
@@ -787,49 +881,57 @@ def main():
     tree_parser.add_argument("--export", "-e", help="Export to CSV file")
     tree_parser.set_defaults(func=cmd_build_tree)
 
-    # Stats command
+
+def _add_stats_parser(subparsers):
     stats_parser = subparsers.add_parser("stats", help="Display database statistics")
     stats_parser.set_defaults(func=cmd_stats)
 
-    # Search command
+
+def _add_search_parser(subparsers):
     search_parser = subparsers.add_parser("search", help="Search for profiles")
     search_parser.add_argument("name", help="Name to search for")
     search_parser.set_defaults(func=cmd_search)
 
-    # Export command
+
+def _add_export_parser(subparsers):
     export_parser = subparsers.add_parser("export", help="Export profiles by haplogroup")
     export_parser.add_argument("haplogroup", help="Haplogroup to export")
     export_parser.add_argument("output", help="Output CSV file")
     export_parser.set_defaults(func=cmd_export)
 
-    # Compare haplogroups command
+
+def _add_compare_parser(subparsers):
     compare_parser = subparsers.add_parser("compare", help="Compare two haplogroups to find their relationship")
     compare_parser.add_argument("haplogroup1", help="First haplogroup (e.g., R-A11110)")
     compare_parser.add_argument("haplogroup2", help="Second haplogroup (e.g., R-BY117398)")
     compare_parser.add_argument("--haplotree", default="ftdna_haplotree.json", help="Path to FTDNA haplotree JSON")
     compare_parser.set_defaults(func=cmd_compare)
 
-    # Haplotree info command
+
+def _add_info_parser(subparsers):
     info_parser = subparsers.add_parser("info", help="Show information about a haplogroup")
     info_parser.add_argument("haplogroup", help="Haplogroup name (e.g., R-M269)")
     info_parser.add_argument("--snps", action="store_true", help="Show defining SNPs")
     info_parser.add_argument("--haplotree", default="ftdna_haplotree.json", help="Path to FTDNA haplotree JSON")
     info_parser.set_defaults(func=cmd_haplotree_info)
 
-    # Tree overlaps command
+
+def _add_overlaps_parser(subparsers):
     overlaps_parser = subparsers.add_parser("overlaps", help="Show overlapping profiles between haplogroup trees")
     overlaps_parser.add_argument("haplogroup1", nargs="?", help="First haplogroup (optional)")
     overlaps_parser.add_argument("haplogroup2", nargs="?", help="Second haplogroup (optional)")
     overlaps_parser.add_argument("--export", "-e", help="Export overlaps to CSV file")
     overlaps_parser.set_defaults(func=cmd_tree_overlaps)
 
-    # Tree members command
+
+def _add_members_parser(subparsers):
     members_parser = subparsers.add_parser("members", help="List members of a haplogroup tree")
     members_parser.add_argument("haplogroup", help="Haplogroup to list members for")
     members_parser.add_argument("--export", "-e", help="Export to CSV file")
     members_parser.set_defaults(func=cmd_tree_members)
 
-    # Import from Geni project command
+
+def _add_project_parser(subparsers):
     project_parser = subparsers.add_parser("project", help="Import profiles from a Geni haplogroup project")
     project_parser.add_argument("project_id", help="Geni project ID (numeric part from URL)")
     project_parser.add_argument("haplogroup", help="Haplogroup name (e.g., R-FT86690)")
@@ -837,10 +939,56 @@ def main():
     project_parser.add_argument("--max-propagate", "-m", type=int, default=10, help="Max profiles to propagate from (default: 10)")
     project_parser.set_defaults(func=cmd_import_project)
 
-    # Run interactive command
+
+def _add_run_parser(subparsers):
     run_parser = subparsers.add_parser("run", help="Interactive mode - prompts for profile and haplogroup")
     run_parser.set_defaults(func=cmd_run_interactive)
 
+
+# Declarative subcommand table. main() registers only the subparser named on
+# the command line, so fast commands skip the cost of building all the others.
+SUBCOMMANDS = {
+    "auth": _add_auth_parser,
+    "profile": _add_profile_parser,
+    "family": _add_family_parser,
+    "ancestors": _add_ancestors_parser,
+    "descendants": _add_descendants_parser,
+    "propagate": _add_propagate_parser,
+    "full-tree": _add_full_tree_parser,
+    "import": _add_import_parser,
+    "tree": _add_tree_parser,
+    "stats": _add_stats_parser,
+    "search": _add_search_parser,
+    "export": _add_export_parser,
+    "compare": _add_compare_parser,
+    "info": _add_info_parser,
+    "overlaps": _add_overlaps_parser,
+    "members": _add_members_parser,
+    "project": _add_project_parser,
+    "run": _add_run_parser,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Y-DNA Propagator - Extend Y-DNA propagation along paternal lines using Geni.com data"
+    )
+    parser.add_argument("--config", default="config.json", help="Path to config file")
+    parser.add_argument("--database", default="ydna_propagator.db", help="Path to database file")
+
+    subparsers = parser.add_subparsers(dest="command", help="Available commands")
+
+    # Build only the requested subparser when the first token IS the
+    # command; anything later could be a global option's value (e.g.
+    # "--database stats export ..."), so those cases - like --help and
+    # error output - register the full set
+    requested = sys.argv[1] if len(sys.argv) > 1 else None
+    if requested in SUBCOMMANDS:
+        SUBCOMMANDS[requested](subparsers)
+    else:
+        for add_subparser in SUBCOMMANDS.values():
+            add_subparser(subparsers)
+
     args = parser.parse_args()
 
     if not args.command:
@@ -855,6 +1003,8 @@ def main():
 
 def cmd_run_interactive(args):
     """Interactive mode - prompts for profile ID and haplogroup."""
+    from propagator import YDNAPropagator
+
     print("=" * 60)
     print("Y-DNA Propagator - Interactive Mode")
     print("=" * 60)
@@ -963,20 +1113,20 @@ def cmd_run_interactive(args):
     stats = propagator.propagate_full_tree(profile_id, haplogroup, source=source, resume=resume)
 
     # Export results
-    profiles = propagator.db.get_profiles_by_haplogroup(haplogroup)
     root_profile = propagator.db.get_profile(stats["root_profile_id"])
 
     if root_profile:
         export_file = generate_tree_filename(root_profile, prefix=f"tree_{haplogroup}")
     else:
-        export_file = f"tree_{haplogroup}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        export_file = f"tree_{haplogroup}_{_run_timestamp()}.csv"
 
-    export_profiles_csv(profiles, export_file)
+    count = export_profiles_csv(
+        propagator.db.iter_profiles_by_haplogroup(haplogroup), export_file)
 
     print()
     print("=" * 60)
     print("Complete!")
-    print(f"  Profiles with {haplogroup}: {len(profiles)}")
+    print(f"  Profiles with {haplogroup}: {count}")
     print(f"  Exported to: {export_file}")
     print("=" * 60)
 
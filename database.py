@@ -4,28 +4,180 @@ SQLite Database for Y-DNA Propagator
 Stores profiles, paternal relationships, and haplogroup data for offline research.
 """
 
+import hashlib
 import json
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime
+from functools import wraps
 from pathlib import Path
 from typing import Optional
 
+try:
+    import orjson
+
+    def _dumps(obj) -> str:
+        """Serialize with orjson (Rust encoder, several times faster)."""
+        return orjson.dumps(obj).decode()
+
+    def _dumps_canonical(obj) -> bytes:
+        """Compact sorted-key bytes for content hashing and blob storage."""
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj) -> str:
+        """Serialize with the stdlib fallback."""
+        return json.dumps(obj)
+
+    def _dumps_canonical(obj) -> bytes:
+        """Compact sorted-key bytes for content hashing and blob storage."""
+        return json.dumps(obj, sort_keys=True, separators=(",", ":")).encode()
+
+    _loads = json.loads
+
+
+def _locked(method):
+    """Serialize a write method on the connection's write lock.
+
+    WAL lets any number of reader threads run against one writer, so only
+    the mutating methods need the lock when the connection is shared across
+    threads.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._write_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+# SQL for the per-node hot paths, hoisted so every call presents the exact
+# same statement text to sqlite3's statement cache
+_SQL_GET_PROFILE = "SELECT * FROM profiles WHERE geni_id = ?"
+
+_SQL_GET_FATHER = """
+    SELECT p.* FROM profiles p
+    JOIN paternal_links pl ON p.geni_id = pl.father_id
+    WHERE pl.child_id = ?
+"""
+
+_SQL_GET_SONS = """
+    SELECT p.* FROM profiles p
+    JOIN paternal_links pl ON p.geni_id = pl.child_id
+    WHERE pl.father_id = ?
+"""
+
+# Tested rows first via the partial index, then any row; two narrow LIMIT 1
+# probes beat one ORDER BY over every row the profile has
+_SQL_GET_HAPLOGROUP_TESTED = """
+    SELECT * FROM haplogroups WHERE profile_id = ? AND is_tested = 1
+    ORDER BY created_at DESC LIMIT 1
+"""
+
+_SQL_GET_HAPLOGROUP_ANY = """
+    SELECT * FROM haplogroups WHERE profile_id = ?
+    ORDER BY created_at DESC LIMIT 1
+"""
+
+_SQL_UPSERT_PROFILE = """
+    INSERT INTO profiles (
+        geni_id, guid, display_name, first_name, middle_name, last_name,
+        maiden_name, suffix, gender, birth_date, birth_place,
+        death_date, death_place, is_alive, occupation, about_me,
+        fetched_at, updated_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(geni_id) DO UPDATE SET
+        guid = excluded.guid,
+        display_name = excluded.display_name,
+        first_name = excluded.first_name,
+        middle_name = excluded.middle_name,
+        last_name = excluded.last_name,
+        maiden_name = excluded.maiden_name,
+        suffix = excluded.suffix,
+        gender = excluded.gender,
+        birth_date = excluded.birth_date,
+        birth_place = excluded.birth_place,
+        death_date = excluded.death_date,
+        death_place = excluded.death_place,
+        is_alive = excluded.is_alive,
+        occupation = excluded.occupation,
+        about_me = excluded.about_me,
+        updated_at = excluded.updated_at
+"""
+
+_SQL_UPSERT_PROFILE_RAW = """
+    INSERT INTO profiles_raw (geni_id, raw_data, content_hash, fetched_at)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(geni_id) DO UPDATE SET
+        raw_data = excluded.raw_data,
+        content_hash = excluded.content_hash,
+        fetched_at = excluded.fetched_at
+"""
+
+_SQL_GET_PROFILE_HASH = "SELECT content_hash FROM profiles_raw WHERE geni_id = ?"
+
+_SQL_UPSERT_UNION = """
+    INSERT INTO unions (
+        geni_id, partners, children, marriage_date, marriage_place,
+        divorce_date, status, raw_data, content_hash, fetched_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(geni_id) DO UPDATE SET
+        partners = excluded.partners,
+        children = excluded.children,
+        marriage_date = excluded.marriage_date,
+        marriage_place = excluded.marriage_place,
+        divorce_date = excluded.divorce_date,
+        status = excluded.status,
+        raw_data = excluded.raw_data,
+        content_hash = excluded.content_hash,
+        fetched_at = excluded.fetched_at
+"""
+
 
 class Database:
     """SQLite database for storing Geni profiles and Y-DNA data."""
 
-    def __init__(self, db_path: str = "ydna_propagator.db"):
+    def __init__(self, db_path: str = "ydna_propagator.db", unsafe: bool = False):
         self.db_path = db_path
         self.conn = None
+        self._in_bulk = False
+        self._unsafe = unsafe
+        # Read memos for the traversal hot path; cleared whenever a write
+        # could change what they would return
+        self._father_cache = {}
+        self._haplogroup_cache = {}
+        # Reentrant so bulk() can hold it across the single-row writers
+        self._write_lock = threading.RLock()
         self._connect()
         self._create_tables()
 
     def _connect(self):
         """Connect to the SQLite database."""
-        self.conn = sqlite3.connect(self.db_path)
+        # The connection is shared across fetch worker threads; sqlite3
+        # serializes individual statements and _write_lock keeps multi-
+        # statement writes atomic
+        self.conn = sqlite3.connect(self.db_path, cached_statements=256,
+                                    check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
         # Enable foreign keys
         self.conn.execute("PRAGMA foreign_keys = ON")
+        # WAL keeps readers from blocking the propagation writes, and with it
+        # synchronous=NORMAL is safe (fsync per checkpoint, not per commit)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        # 64 MiB page cache plus mmap'd reads: export/stats queries re-touch
+        # the same pages constantly and the defaults (~2 MB) thrash
+        self.conn.execute("PRAGMA cache_size = -65536")
+        self.conn.execute("PRAGMA mmap_size = 268435456")
+        # Sorts and temp indexes in RAM; wait out writer contention instead of
+        # failing immediately with "database is locked"
+        self.conn.execute("PRAGMA temp_store = MEMORY")
+        self.conn.execute("PRAGMA busy_timeout = 5000")
+        if self._unsafe:
+            # Re-importable data only: no fsync at all, corruption on power
+            # loss is possible
+            self.conn.execute("PRAGMA synchronous = OFF")
 
     def _create_tables(self):
         """Create database tables if they don't exist."""
@@ -50,9 +202,21 @@ class Database:
                 is_alive INTEGER,
                 occupation TEXT,
                 about_me TEXT,
-                raw_data TEXT,
                 fetched_at TEXT,
-                updated_at TEXT
+                updated_at TEXT,
+                family_fetched_at TEXT
+            )
+        """)
+
+        # Raw payload sidecar - the full Geni JSON lives out of the hot
+        # profiles rows so traversal SELECTs never drag the blob through the
+        # page cache
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS profiles_raw (
+                geni_id TEXT PRIMARY KEY,
+                raw_data TEXT,
+                content_hash BLOB,
+                fetched_at TEXT
             )
         """)
 
@@ -127,6 +291,7 @@ class Database:
                 divorce_date TEXT,
                 status TEXT,
                 raw_data TEXT,
+                content_hash BLOB,
                 fetched_at TEXT
             )
         """)
@@ -156,63 +321,161 @@ class Database:
             )
         """)
 
+        # Closure-complete table - records that a whole propagation tree was
+        # exhausted for a haplogroup, so resumed runs can skip it outright
+        # instead of re-walking every known node
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS closure_complete (
+                root_profile_id TEXT NOT NULL,
+                haplogroup TEXT NOT NULL,
+                generations_bound INTEGER NOT NULL,
+                completed_at TEXT,
+                PRIMARY KEY (root_profile_id, haplogroup)
+            )
+        """)
+
+        # Export checkpoints table - tracks the last haplogroups rowid written
+        # per CSV export so resume runs only append rows added since
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS export_checkpoints (
+                haplogroup TEXT PRIMARY KEY,
+                last_rowid INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT
+            )
+        """)
+
         # Create indexes for faster lookups
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_profiles_gender ON profiles(gender)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_profiles_last_name ON profiles(last_name)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_paternal_father ON paternal_links(father_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_paternal_child ON paternal_links(child_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_haplogroups_profile ON haplogroups(profile_id)")
+        # Expression index so case-folded surname joins stay indexed
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_profiles_last_name_lower ON profiles(LOWER(last_name))")
+        # Covering composite indexes: get_father/get_sons join on one column
+        # and read the other, so the lookup is satisfied from the index alone
+        # (the old single-column indexes forced a rowid fetch per match)
+        cursor.execute("DROP INDEX IF EXISTS idx_paternal_father")
+        cursor.execute("DROP INDEX IF EXISTS idx_paternal_child")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_pl_child_father ON paternal_links(child_id, father_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_pl_father_child ON paternal_links(father_id, child_id)")
+        cursor.execute("DROP INDEX IF EXISTS idx_haplogroups_profile")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_hg_profile_created ON haplogroups(profile_id, created_at DESC)")
+        # Partial index so the common "tested result for this profile" lookup
+        # never wades through propagated rows
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_hg_tested
+            ON haplogroups(profile_id, created_at DESC) WHERE is_tested = 1
+        """)
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_haplogroups_haplogroup ON haplogroups(haplogroup)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_explored_haplogroup ON explored_profiles(haplogroup)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_tree_memberships_profile ON tree_memberships(profile_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_tree_memberships_haplogroup ON tree_memberships(haplogroup)")
 
+        # One-time migrations: add content_hash columns to databases created
+        # before the no-op resync short-circuit
+        for table in ("profiles_raw", "unions"):
+            columns = [row["name"] for row in cursor.execute(f"PRAGMA table_info({table})")]
+            if "content_hash" not in columns:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN content_hash BLOB")
+
+        # One-time migration for databases created before the raw_data split
+        columns = [row["name"] for row in cursor.execute("PRAGMA table_info(profiles)")]
+        if "raw_data" in columns:
+            cursor.execute("""
+                INSERT OR IGNORE INTO profiles_raw (geni_id, raw_data, fetched_at)
+                SELECT geni_id, raw_data, fetched_at FROM profiles
+            """)
+            cursor.execute("ALTER TABLE profiles DROP COLUMN raw_data")
+
+        # One-time migration for databases created before family freshness
+        # tracking
+        if "family_fetched_at" not in columns:
+            cursor.execute("ALTER TABLE profiles ADD COLUMN family_fetched_at TEXT")
+
         self.conn.commit()
 
-    def save_profile(self, profile_data: dict) -> str:
+    def _commit(self):
+        """Commit unless inside a bulk() block, which commits once at the end."""
+        if not self._in_bulk:
+            self.conn.commit()
+
+    @contextmanager
+    def bulk(self):
         """
-        Save or update a profile from Geni API response.
+        Defer commits for a batch of writes.
 
-        Returns the geni_id of the saved profile.
+        Wraps the block in a single BEGIN IMMEDIATE/COMMIT so ingest loops
+        pay one fsync per batch instead of one per row; rolls back on error.
+        Holds the write lock for the whole block.
         """
-        geni_id = profile_data.get("id", "")
-        if not geni_id:
-            return None
+        with self._write_lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self._in_bulk = True
+            try:
+                yield self
+            except BaseException:
+                self.conn.rollback()
+                raise
+            else:
+                self.conn.commit()
+            finally:
+                self._in_bulk = False
+
+    @contextmanager
+    def bulk_load_mode(self):
+        """
+        Drop secondary indexes for the duration of a first-time bulk load.
 
-        # Extract event data
-        birth = profile_data.get("birth", {}) or {}
-        death = profile_data.get("death", {}) or {}
+        Every insert otherwise maintains all idx_* indexes; dropping them,
+        loading, then replaying the saved DDL (plus ANALYZE so the planner
+        trusts the rebuilt indexes) makes initial ingest several times
+        faster. Combine with bulk() for the transaction batching.
+        """
+        with self._write_lock:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                SELECT name, sql FROM sqlite_master
+                WHERE type = 'index' AND name LIKE 'idx_%' AND sql IS NOT NULL
+            """)
+            saved = cursor.fetchall()
+            for row in saved:
+                cursor.execute(f"DROP INDEX {row['name']}")
+            self.conn.commit()
+            try:
+                yield self
+            finally:
+                for row in saved:
+                    cursor.execute(row["sql"])
+                cursor.execute("ANALYZE")
+                self.conn.commit()
+
+    @staticmethod
+    def _nested_str(d: dict, key: str, sub: str):
+        """Get d[key][sub] when d[key] is a dict, else d[key] as-is."""
+        v = d.get(key)
+        if isinstance(v, dict):
+            return v.get(sub)
+        return v
+
+    @staticmethod
+    def _canonical(data: dict) -> tuple:
+        """
+        Canonical JSON bytes and a 16-byte blake2b digest of a payload.
 
-        cursor = self.conn.cursor()
-        now = datetime.utcnow().isoformat()
+        Identical payloads always hash identically regardless of key order,
+        so re-syncs can skip rewriting unchanged rows. The bytes go into
+        raw_data as-is: storing the encoder's output directly skips a
+        decode/re-encode round trip per save, and _loads accepts either
+        bytes or the str form older rows were written in.
+        """
+        canonical = _dumps_canonical(data)
+        return canonical, hashlib.blake2b(canonical, digest_size=16).digest()
 
-        cursor.execute("""
-            INSERT INTO profiles (
-                geni_id, guid, display_name, first_name, middle_name, last_name,
-                maiden_name, suffix, gender, birth_date, birth_place,
-                death_date, death_place, is_alive, occupation, about_me,
-                raw_data, fetched_at, updated_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(geni_id) DO UPDATE SET
-                guid = excluded.guid,
-                display_name = excluded.display_name,
-                first_name = excluded.first_name,
-                middle_name = excluded.middle_name,
-                last_name = excluded.last_name,
-                maiden_name = excluded.maiden_name,
-                suffix = excluded.suffix,
-                gender = excluded.gender,
-                birth_date = excluded.birth_date,
-                birth_place = excluded.birth_place,
-                death_date = excluded.death_date,
-                death_place = excluded.death_place,
-                is_alive = excluded.is_alive,
-                occupation = excluded.occupation,
-                about_me = excluded.about_me,
-                raw_data = excluded.raw_data,
-                updated_at = excluded.updated_at
-        """, (
-            geni_id,
+    @classmethod
+    def _profile_row(cls, profile_data: dict, now: str) -> tuple:
+        """Build the parameter tuple for a profiles upsert."""
+        birth = profile_data.get("birth", {}) or {}
+        death = profile_data.get("death", {}) or {}
+        return (
+            profile_data.get("id", ""),
             profile_data.get("guid"),
             profile_data.get("display_name") or profile_data.get("name"),
             profile_data.get("first_name"),
@@ -221,62 +484,132 @@ class Database:
             profile_data.get("maiden_name"),
             profile_data.get("suffix"),
             profile_data.get("gender"),
-            birth.get("date", {}).get("formatted_date") if isinstance(birth.get("date"), dict) else birth.get("date"),
-            birth.get("location", {}).get("place_name") if isinstance(birth.get("location"), dict) else birth.get("location"),
-            death.get("date", {}).get("formatted_date") if isinstance(death.get("date"), dict) else death.get("date"),
-            death.get("location", {}).get("place_name") if isinstance(death.get("location"), dict) else death.get("location"),
+            cls._nested_str(birth, "date", "formatted_date"),
+            cls._nested_str(birth, "location", "place_name"),
+            cls._nested_str(death, "date", "formatted_date"),
+            cls._nested_str(death, "location", "place_name"),
             1 if profile_data.get("is_alive") else 0,
             profile_data.get("occupation"),
             profile_data.get("about_me"),
-            json.dumps(profile_data),
             now,
             now
-        ))
+        )
 
-        self.conn.commit()
+    @classmethod
+    def _union_row(cls, union_data: dict, now: str) -> tuple:
+        """Build the parameter tuple for a unions upsert."""
+        marriage = union_data.get("marriage", {}) or {}
+        divorce = union_data.get("divorce", {}) or {}
+        canonical, digest = cls._canonical(union_data)
+        return (
+            union_data.get("id", ""),
+            _dumps(union_data.get("partners", [])),
+            _dumps(union_data.get("children", [])),
+            cls._nested_str(marriage, "date", "formatted_date"),
+            cls._nested_str(marriage, "location", "place_name"),
+            cls._nested_str(divorce, "date", "formatted_date"),
+            union_data.get("status"),
+            canonical,
+            digest,
+            now
+        )
+
+    @_locked
+    def save_profile(self, profile_data: dict) -> str:
+        """
+        Save or update a profile from Geni API response.
+
+        Returns the geni_id of the saved profile.
+        """
+        geni_id = profile_data.get("id", "")
+        if not geni_id:
+            return None
+
+        canonical, digest = self._canonical(profile_data)
+        row = self.conn.execute(_SQL_GET_PROFILE_HASH, (geni_id,)).fetchone()
+        if row and row["content_hash"] == digest:
+            # Unchanged since the last sync - skip the rewrite entirely
+            return geni_id
+
+        cursor = self.conn.cursor()
+        now = datetime.utcnow().isoformat()
+
+        cursor.execute(_SQL_UPSERT_PROFILE, self._profile_row(profile_data, now))
+        cursor.execute(_SQL_UPSERT_PROFILE_RAW, (geni_id, canonical, digest, now))
+
+        self._father_cache.clear()
+        self._commit()
         return geni_id
 
+    @_locked
+    def save_profiles(self, profiles) -> int:
+        """
+        Save or update many profiles in one transaction.
+
+        Accepts any iterable of Geni profile dicts; rows without an id are
+        skipped. One executemany + one commit instead of a commit per row.
+        Returns the number of rows written.
+        """
+        now = datetime.utcnow().isoformat()
+        kept = []
+        raw_rows = []
+        for p in profiles:
+            geni_id = p.get("id")
+            if not geni_id:
+                continue
+            canonical, digest = self._canonical(p)
+            row = self.conn.execute(_SQL_GET_PROFILE_HASH, (geni_id,)).fetchone()
+            if row and row["content_hash"] == digest:
+                continue
+            kept.append(p)
+            raw_rows.append((geni_id, canonical, digest, now))
+        if not kept:
+            return 0
+
+        self.conn.executemany(_SQL_UPSERT_PROFILE,
+                              [self._profile_row(p, now) for p in kept])
+        self.conn.executemany(_SQL_UPSERT_PROFILE_RAW, raw_rows)
+
+        self._father_cache.clear()
+        self._commit()
+        return len(kept)
+
+    @_locked
     def save_union(self, union_data: dict) -> str:
         """Save or update a union from Geni API response."""
         geni_id = union_data.get("id", "")
         if not geni_id:
             return None
 
-        marriage = union_data.get("marriage", {}) or {}
-        divorce = union_data.get("divorce", {}) or {}
+        _, digest = self._canonical(union_data)
+        row = self.conn.execute(
+            "SELECT content_hash FROM unions WHERE geni_id = ?", (geni_id,)
+        ).fetchone()
+        if row and row["content_hash"] == digest:
+            return geni_id
 
         cursor = self.conn.cursor()
         now = datetime.utcnow().isoformat()
 
-        cursor.execute("""
-            INSERT INTO unions (
-                geni_id, partners, children, marriage_date, marriage_place,
-                divorce_date, status, raw_data, fetched_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(geni_id) DO UPDATE SET
-                partners = excluded.partners,
-                children = excluded.children,
-                marriage_date = excluded.marriage_date,
-                marriage_place = excluded.marriage_place,
-                divorce_date = excluded.divorce_date,
-                status = excluded.status,
-                raw_data = excluded.raw_data,
-                fetched_at = excluded.fetched_at
-        """, (
-            geni_id,
-            json.dumps(union_data.get("partners", [])),
-            json.dumps(union_data.get("children", [])),
-            marriage.get("date", {}).get("formatted_date") if isinstance(marriage.get("date"), dict) else marriage.get("date"),
-            marriage.get("location", {}).get("place_name") if isinstance(marriage.get("location"), dict) else marriage.get("location"),
-            divorce.get("date", {}).get("formatted_date") if isinstance(divorce.get("date"), dict) else divorce.get("date"),
-            union_data.get("status"),
-            json.dumps(union_data),
-            now
-        ))
+        cursor.execute(_SQL_UPSERT_UNION, self._union_row(union_data, now))
 
-        self.conn.commit()
+        self._commit()
         return geni_id
 
+    @_locked
+    def save_unions(self, unions) -> int:
+        """Save or update many unions in one transaction."""
+        now = datetime.utcnow().isoformat()
+        rows = [self._union_row(u, now) for u in unions if u.get("id")]
+        if not rows:
+            return 0
+
+        self.conn.executemany(_SQL_UPSERT_UNION, rows)
+
+        self._commit()
+        return len(rows)
+
+    @_locked
     def add_paternal_link(self, father_id: str, child_id: str,
                           source: str = "geni", confidence: str = "confirmed"):
         """Add a father-child relationship."""
@@ -288,8 +621,29 @@ class Database:
             VALUES (?, ?, ?, ?, ?)
         """, (father_id, child_id, source, confidence, now))
 
-        self.conn.commit()
+        self._father_cache.pop(child_id, None)
+        self._commit()
 
+    @_locked
+    def add_paternal_links(self, links, source: str = "geni",
+                           confidence: str = "confirmed"):
+        """
+        Add many father-child relationships in one transaction.
+
+        links is an iterable of (father_id, child_id) tuples.
+        """
+        now = datetime.utcnow().isoformat()
+
+        self.conn.executemany("""
+            INSERT OR IGNORE INTO paternal_links (father_id, child_id, source, confidence, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(father_id, child_id, source, confidence, now)
+              for father_id, child_id in links])
+
+        self._father_cache.clear()
+        self._commit()
+
+    @_locked
     def add_haplogroup(self, profile_id: str, haplogroup: str, source: str,
                        is_tested: bool = False, propagated_from: str = None,
                        confidence: str = "high", notes: str = None):
@@ -314,45 +668,164 @@ class Database:
             now
         ))
 
-        self.conn.commit()
+        self._haplogroup_cache.pop(profile_id, None)
+        self._commit()
+
+    @_locked
+    def add_haplogroups_bulk(self, rows, is_tested: bool = False,
+                             propagated_from: str = None, confidence: str = "high"):
+        """
+        Add many haplogroup assignments in a single transaction.
+
+        rows is an iterable of (profile_id, haplogroup, source) tuples. Shared
+        flags apply to every row. Commits once instead of once per row.
+        """
+        cursor = self.conn.cursor()
+        now = datetime.utcnow().isoformat()
+
+        cursor.executemany("""
+            INSERT INTO haplogroups (
+                profile_id, haplogroup, source, is_tested, is_propagated,
+                propagated_from, confidence, notes, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (profile_id, haplogroup, source,
+             1 if is_tested else 0,
+             1 if propagated_from else 0,
+             propagated_from, confidence, None, now)
+            for profile_id, haplogroup, source in rows
+        ])
+
+        self._haplogroup_cache.clear()
+        self._commit()
 
     def get_profile(self, geni_id: str) -> Optional[dict]:
         """Get a profile by Geni ID."""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM profiles WHERE geni_id = ?", (geni_id,))
-        row = cursor.fetchone()
+        row = self.conn.execute(_SQL_GET_PROFILE, (geni_id,)).fetchone()
         return dict(row) if row else None
 
+    def get_raw_profile(self, geni_id: str) -> Optional[dict]:
+        """Get the full Geni API payload saved for a profile, if any."""
+        row = self.conn.execute(
+            "SELECT raw_data FROM profiles_raw WHERE geni_id = ?", (geni_id,)
+        ).fetchone()
+        return _loads(row["raw_data"]) if row and row["raw_data"] else None
+
     def get_father(self, child_id: str) -> Optional[dict]:
-        """Get the father of a profile."""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT p.* FROM profiles p
-            JOIN paternal_links pl ON p.geni_id = pl.father_id
-            WHERE pl.child_id = ?
-        """, (child_id,))
-        row = cursor.fetchone()
-        return dict(row) if row else None
+        """Get the father of a profile (memoized; shared ancestors repeat)."""
+        if child_id in self._father_cache:
+            return self._father_cache[child_id]
+        row = self.conn.execute(_SQL_GET_FATHER, (child_id,)).fetchone()
+        father = dict(row) if row else None
+        self._father_cache[child_id] = father
+        return father
 
     def get_sons(self, father_id: str) -> list:
         """Get all sons of a profile."""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT p.* FROM profiles p
-            JOIN paternal_links pl ON p.geni_id = pl.child_id
-            WHERE pl.father_id = ?
-        """, (father_id,))
+        cursor = self.conn.execute(_SQL_GET_SONS, (father_id,))
         return [dict(row) for row in cursor.fetchall()]
 
+    @_locked
+    def set_family_fetched(self, profile_id: str):
+        """Record that a profile's immediate family has just been fetched."""
+        self.conn.execute(
+            "UPDATE profiles SET family_fetched_at = ? WHERE geni_id = ?",
+            (datetime.utcnow().isoformat(), profile_id))
+        self._commit()
+
+    @_locked
+    def set_family_fetched_many(self, profile_ids):
+        """Record family fetches for a whole frontier in one transaction."""
+        now = datetime.utcnow().isoformat()
+        self.conn.executemany(
+            "UPDATE profiles SET family_fetched_at = ? WHERE geni_id = ?",
+            [(now, pid) for pid in profile_ids])
+        self._commit()
+
+    def get_family_fetched_since(self, profile_ids, cutoff: str) -> set:
+        """
+        Get the IDs whose immediate family was fetched after the cutoff.
+
+        cutoff is an ISO timestamp; one chunked IN query covers the whole
+        frontier.
+        """
+        fresh = set()
+        ids = list(profile_ids)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            cursor = self.conn.execute(f"""
+                SELECT geni_id FROM profiles
+                WHERE geni_id IN ({placeholders}) AND family_fetched_at > ?
+            """, chunk + [cutoff])
+            fresh.update(row[0] for row in cursor.fetchall())
+        return fresh
+
     def get_haplogroup(self, profile_id: str) -> Optional[dict]:
         """Get haplogroup assignment for a profile (returns most relevant one)."""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT * FROM haplogroups WHERE profile_id = ?
-            ORDER BY is_tested DESC, created_at DESC LIMIT 1
-        """, (profile_id,))
-        row = cursor.fetchone()
-        return dict(row) if row else None
+        if profile_id in self._haplogroup_cache:
+            return self._haplogroup_cache[profile_id]
+        row = self.conn.execute(_SQL_GET_HAPLOGROUP_TESTED, (profile_id,)).fetchone()
+        if row is None:
+            row = self.conn.execute(_SQL_GET_HAPLOGROUP_ANY, (profile_id,)).fetchone()
+        result = dict(row) if row else None
+        self._haplogroup_cache[profile_id] = result
+        return result
+
+    def get_assigned_pairs(self) -> set:
+        """
+        Get every (profile_id, haplogroup) assignment pair in one scan.
+
+        Lets a propagation run answer "does this profile already carry this
+        haplogroup" with a set lookup instead of a point query per node.
+        """
+        cursor = self.conn.execute("SELECT profile_id, haplogroup FROM haplogroups")
+        return {(row[0], row[1]) for row in cursor.fetchall()}
+
+    def get_explored_set(self, haplogroup: str) -> set:
+        """Get the IDs of all profiles already explored for a haplogroup."""
+        cursor = self.conn.execute(
+            "SELECT profile_id FROM explored_profiles WHERE haplogroup = ?",
+            (haplogroup,))
+        return {row[0] for row in cursor.fetchall()}
+
+    def get_haplogroups_bulk(self, profile_ids) -> dict:
+        """
+        Get the most relevant haplogroup for many profiles in one query.
+
+        Returns {profile_id: haplogroup row dict}; profiles without any
+        assignment are absent. Per-profile selection matches get_haplogroup
+        (tested assignments first, then newest), and results feed the same
+        memo cache so later scalar lookups are free.
+        """
+        result = {}
+        missing = []
+        for pid in dict.fromkeys(profile_ids):
+            if pid in self._haplogroup_cache:
+                cached = self._haplogroup_cache[pid]
+                if cached is not None:
+                    result[pid] = cached
+            else:
+                missing.append(pid)
+
+        # Chunk to stay under SQLite's bound-parameter limit
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            cursor = self.conn.execute(f"""
+                SELECT * FROM haplogroups WHERE profile_id IN ({placeholders})
+                ORDER BY is_tested DESC, created_at DESC
+            """, chunk)
+            # Global ordering puts each profile's best row first, so the
+            # first occurrence per profile wins
+            for row in cursor.fetchall():
+                pid = row["profile_id"]
+                if pid not in result:
+                    result[pid] = dict(row)
+            for pid in chunk:
+                self._haplogroup_cache[pid] = result.get(pid)
+
+        return result
 
     def get_profile_haplogroups(self, profile_id: str) -> list:
         """Get ALL haplogroup assignments for a profile."""
@@ -363,8 +836,21 @@ class Database:
         """, (profile_id,))
         return [dict(row) for row in cursor.fetchall()]
 
+    @staticmethod
+    def _iter_rows(cursor, batch_size: int = 1000):
+        """Yield rows as dicts in fetchmany batches to bound memory."""
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from (dict(row) for row in rows)
+
     def get_profiles_by_haplogroup(self, haplogroup: str) -> list:
         """Get all profiles with a specific haplogroup."""
+        return list(self.iter_profiles_by_haplogroup(haplogroup))
+
+    def iter_profiles_by_haplogroup(self, haplogroup: str):
+        """Stream profiles with a specific haplogroup without materializing a list."""
         cursor = self.conn.cursor()
         cursor.execute("""
             SELECT p.*, h.haplogroup, h.source as haplogroup_source, h.is_tested
@@ -373,21 +859,112 @@ class Database:
             WHERE h.haplogroup LIKE ?
             ORDER BY p.last_name, p.first_name
         """, (f"{haplogroup}%",))
-        return [dict(row) for row in cursor.fetchall()]
+        yield from self._iter_rows(cursor)
+
+    def find_surname_connections(self, haplogroup1: str, haplogroup2: str) -> list:
+        """
+        Find profiles from two haplogroups that share a surname.
+
+        The surname intersection and both profile selections run in SQL
+        against the case-folded surname index, so neither haplogroup's full
+        profile list is materialized in Python. Haplogroup matching is by
+        prefix, like get_profiles_by_haplogroup.
+
+        Returns a list of dicts with surname, haplogroup1_profiles and
+        haplogroup2_profiles, sorted by surname.
+        """
+        shared_sql = """
+            SELECT LOWER(p.last_name) FROM profiles p
+            JOIN haplogroups h ON h.profile_id = p.geni_id
+            WHERE h.haplogroup LIKE ? AND p.last_name IS NOT NULL AND p.last_name != ''
+            INTERSECT
+            SELECT LOWER(p.last_name) FROM profiles p
+            JOIN haplogroups h ON h.profile_id = p.geni_id
+            WHERE h.haplogroup LIKE ? AND p.last_name IS NOT NULL AND p.last_name != ''
+        """
+        patterns = (f"{haplogroup1}%", f"{haplogroup2}%")
+
+        def grouped_profiles(pattern):
+            cursor = self.conn.execute(f"""
+                SELECT DISTINCT p.* FROM profiles p
+                JOIN haplogroups h ON h.profile_id = p.geni_id
+                WHERE h.haplogroup LIKE ?
+                  AND LOWER(p.last_name) IN ({shared_sql})
+            """, (pattern,) + patterns)
+            grouped = {}
+            for row in cursor.fetchall():
+                profile = dict(row)
+                grouped.setdefault(profile["last_name"].lower(), []).append(profile)
+            return grouped
+
+        group1 = grouped_profiles(patterns[0])
+        group2 = grouped_profiles(patterns[1])
+        return [{
+            "surname": surname,
+            "haplogroup1_profiles": group1.get(surname, []),
+            "haplogroup2_profiles": group2.get(surname, [])
+        } for surname in sorted(set(group1) & set(group2))]
+
+    def iter_profiles_by_haplogroup_since(self, haplogroup: str, last_rowid: int):
+        """Stream profiles whose haplogroup row was added after the checkpoint."""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT p.*, h.haplogroup, h.source as haplogroup_source, h.is_tested
+            FROM profiles p
+            JOIN haplogroups h ON p.geni_id = h.profile_id
+            WHERE h.haplogroup LIKE ? AND h.id > ?
+            ORDER BY h.id
+        """, (f"{haplogroup}%", last_rowid))
+        yield from self._iter_rows(cursor)
+
+    def get_export_checkpoint(self, haplogroup: str) -> int:
+        """Get the last exported haplogroups rowid for a haplogroup (0 if never)."""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT last_rowid FROM export_checkpoints WHERE haplogroup = ?",
+            (haplogroup,)
+        )
+        row = cursor.fetchone()
+        return row["last_rowid"] if row else 0
+
+    @_locked
+    def set_export_checkpoint(self, haplogroup: str, last_rowid: int):
+        """Record the last haplogroups rowid covered by an export."""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            INSERT OR REPLACE INTO export_checkpoints (haplogroup, last_rowid, updated_at)
+            VALUES (?, ?, ?)
+        """, (haplogroup, last_rowid, datetime.now().isoformat()))
+        self.conn.commit()
+
+    def get_max_haplogroup_rowid(self, haplogroup: str) -> int:
+        """Get the highest haplogroups rowid matching a haplogroup prefix."""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT COALESCE(MAX(id), 0) AS max_id FROM haplogroups WHERE haplogroup LIKE ?",
+            (f"{haplogroup}%",)
+        )
+        return cursor.fetchone()["max_id"]
 
     def get_male_profiles(self) -> list:
         """Get all male profiles in the database."""
+        return list(self.iter_male_profiles())
+
+    def iter_male_profiles(self):
+        """Stream male profiles without materializing the full list."""
         cursor = self.conn.cursor()
         cursor.execute("SELECT * FROM profiles WHERE gender = 'male' ORDER BY last_name, first_name")
-        return [dict(row) for row in cursor.fetchall()]
+        yield from self._iter_rows(cursor)
 
     def get_profiles_without_haplogroup(self, gender: str = "male") -> list:
         """Get profiles that don't have a haplogroup assigned."""
         cursor = self.conn.cursor()
+        # NOT EXISTS lets the planner do an indexed anti-join probe against
+        # idx_hg_profile_created instead of materializing the LEFT JOIN
         cursor.execute("""
             SELECT p.* FROM profiles p
-            LEFT JOIN haplogroups h ON p.geni_id = h.profile_id
-            WHERE p.gender = ? AND h.id IS NULL
+            WHERE p.gender = ?
+              AND NOT EXISTS (SELECT 1 FROM haplogroups h WHERE h.profile_id = p.geni_id)
             ORDER BY p.last_name, p.first_name
         """, (gender,))
         return [dict(row) for row in cursor.fetchall()]
@@ -396,41 +973,53 @@ class Database:
         """
         Get paternal line ancestors (father's father's father...).
 
-        Returns list of profiles from child to most distant ancestor.
+        Returns list of profiles from child to most distant ancestor. The
+        whole chain is walked by one recursive CTE inside SQLite instead of
+        one SELECT per generation.
         """
-        ancestors = []
-        current_id = profile_id
-        generation = 0
-
-        while generation < max_generations:
-            father = self.get_father(current_id)
-            if not father:
-                break
-            ancestors.append(father)
-            current_id = father["geni_id"]
-            generation += 1
-
-        return ancestors
+        cursor = self.conn.execute("""
+            WITH RECURSIVE line(geni_id, gen) AS (
+                SELECT father_id, 1 FROM paternal_links WHERE child_id = ?
+                UNION ALL
+                SELECT pl.father_id, line.gen + 1
+                FROM paternal_links pl
+                JOIN line ON pl.child_id = line.geni_id
+                WHERE line.gen < ?
+            )
+            SELECT p.* FROM line JOIN profiles p ON p.geni_id = line.geni_id
+            ORDER BY line.gen
+        """, (profile_id, max_generations))
+        return [dict(row) for row in cursor.fetchall()]
 
     def get_paternal_descendants(self, profile_id: str, max_generations: int = 50) -> list:
         """
-        Get all paternal line descendants recursively.
+        Get all paternal line descendants.
 
-        Returns list of dicts with profile and generation info.
+        Returns list of dicts with profile and generation info. A single
+        recursive CTE replaces the former one-query-per-node recursion, so a
+        tree of N descendants costs one index-driven scan instead of N round
+        trips (and cannot hit Python's recursion limit).
         """
-        descendants = []
-
-        def traverse(current_id: str, generation: int):
-            if generation > max_generations:
-                return
-            sons = self.get_sons(current_id)
-            for son in sons:
-                descendants.append({"profile": son, "generation": generation})
-                traverse(son["geni_id"], generation + 1)
+        cursor = self.conn.execute("""
+            WITH RECURSIVE d(geni_id, gen) AS (
+                SELECT child_id, 1 FROM paternal_links WHERE father_id = ?
+                UNION ALL
+                SELECT pl.child_id, d.gen + 1
+                FROM paternal_links pl
+                JOIN d ON pl.father_id = d.geni_id
+                WHERE d.gen < ?
+            )
+            SELECT p.*, d.gen FROM d JOIN profiles p ON p.geni_id = d.geni_id
+        """, (profile_id, max_generations))
 
-        traverse(profile_id, 1)
+        descendants = []
+        for row in cursor:
+            profile = dict(row)
+            generation = profile.pop("gen")
+            descendants.append({"profile": profile, "generation": generation})
         return descendants
 
+    @_locked
     def create_paternal_tree(self, name: str, root_profile_id: str,
                              haplogroup: str = None, description: str = None) -> int:
         """Create a new paternal tree record."""
@@ -445,6 +1034,7 @@ class Database:
         self.conn.commit()
         return cursor.lastrowid
 
+    @_locked
     def mark_explored(self, profile_id: str, haplogroup: str):
         """Mark a profile as explored (its family has been fetched)."""
         cursor = self.conn.cursor()
@@ -474,15 +1064,40 @@ class Database:
         """, (haplogroup,))
         return cursor.fetchone()[0]
 
+    @_locked
     def clear_explored(self, haplogroup: str = None):
         """Clear explored markers. If haplogroup specified, only clear for that haplogroup."""
         cursor = self.conn.cursor()
         if haplogroup:
             cursor.execute("DELETE FROM explored_profiles WHERE haplogroup = ?", (haplogroup,))
+            cursor.execute("DELETE FROM closure_complete WHERE haplogroup = ?", (haplogroup,))
         else:
             cursor.execute("DELETE FROM explored_profiles")
+            cursor.execute("DELETE FROM closure_complete")
         self.conn.commit()
 
+    @_locked
+    def mark_closure_complete(self, root_profile_id: str, haplogroup: str,
+                              generations_bound: int):
+        """Record that the tree below a root was fully explored for a haplogroup."""
+        now = datetime.utcnow().isoformat()
+        self.conn.execute("""
+            INSERT OR REPLACE INTO closure_complete
+                (root_profile_id, haplogroup, generations_bound, completed_at)
+            VALUES (?, ?, ?, ?)
+        """, (root_profile_id, haplogroup, generations_bound, now))
+        self._commit()
+
+    def is_closure_complete(self, root_profile_id: str, haplogroup: str,
+                            generations_bound: int) -> bool:
+        """Check whether a prior run exhausted this tree at least as deeply."""
+        row = self.conn.execute("""
+            SELECT 1 FROM closure_complete
+            WHERE root_profile_id = ? AND haplogroup = ? AND generations_bound >= ?
+        """, (root_profile_id, haplogroup, generations_bound)).fetchone()
+        return row is not None
+
+    @_locked
     def add_tree_membership(self, profile_id: str, haplogroup: str,
                             generation: int = None, root_profile_id: str = None):
         """Add a profile to a haplogroup tree (tracks tree membership, not assignment)."""
@@ -583,6 +1198,7 @@ class Database:
 
         return stats
 
+    @_locked
     def clear_tree_memberships(self, haplogroup: str = None):
         """Clear tree memberships. If haplogroup specified, only clear that tree."""
         cursor = self.conn.cursor()
@@ -596,34 +1212,35 @@ class Database:
         """Get database statistics."""
         cursor = self.conn.cursor()
 
-        stats = {}
-
-        cursor.execute("SELECT COUNT(*) FROM profiles")
-        stats["total_profiles"] = cursor.fetchone()[0]
+        # Conditional aggregates: one pass over each table instead of a
+        # separate scan per counter
+        cursor.execute("""
+            SELECT COUNT(*) AS total_profiles,
+                   COALESCE(SUM(gender = 'male'), 0) AS male_profiles
+            FROM profiles
+        """)
+        stats = dict(cursor.fetchone())
 
-        cursor.execute("SELECT COUNT(*) FROM profiles WHERE gender = 'male'")
-        stats["male_profiles"] = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT COUNT(DISTINCT profile_id) AS profiles_with_haplogroup,
+                   COALESCE(SUM(is_tested), 0) AS tested_haplogroups,
+                   COUNT(DISTINCT haplogroup) AS unique_haplogroups
+            FROM haplogroups
+        """)
+        stats.update(dict(cursor.fetchone()))
 
         cursor.execute("SELECT COUNT(*) FROM paternal_links")
         stats["paternal_links"] = cursor.fetchone()[0]
 
-        cursor.execute("SELECT COUNT(DISTINCT profile_id) FROM haplogroups")
-        stats["profiles_with_haplogroup"] = cursor.fetchone()[0]
-
-        cursor.execute("SELECT COUNT(*) FROM haplogroups WHERE is_tested = 1")
-        stats["tested_haplogroups"] = cursor.fetchone()[0]
-
-        cursor.execute("SELECT COUNT(DISTINCT haplogroup) FROM haplogroups")
-        stats["unique_haplogroups"] = cursor.fetchone()[0]
-
         cursor.execute("SELECT COUNT(*) FROM paternal_trees")
         stats["paternal_trees"] = cursor.fetchone()[0]
 
         return stats
 
     def close(self):
-        """Close the database connection."""
+        """Close the database connection, folding the WAL back into the db file."""
         if self.conn:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
             self.conn.close()
 
 
@@ -6,12 +6,53 @@ using FTDNA's public haplotree data.
 """
 
 import json
+import os
+import pickle
+import sys
+from dataclasses import dataclass
 from typing import Optional, Tuple
 
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+# Bump when the cached attribute layout changes
+_CACHE_VERSION = 3
+
+
+@dataclass(slots=True, frozen=True)
+class LCAResult:
+    """Most recent common ancestor of two haplogroups.
+
+    Slotted and frozen: cheaper to build than a dict in hot comparison
+    loops, and attribute access beats dict subscripting downstream.
+    """
+    name: str
+    id: str
+    distance1: int
+    distance2: int
+    total_distance: int
+
+    def to_dict(self) -> dict:
+        """Return the dict shape older callers expect."""
+        return {
+            'name': self.name,
+            'id': self.id,
+            'distance1': self.distance1,
+            'distance2': self.distance2,
+            'total_distance': self.total_distance
+        }
+
 
 class Haplotree:
     """FTDNA Y-DNA Haplotree for finding haplogroup relationships."""
 
+    # Loaded instances by haplotree path, so repeat constructions in the
+    # same process share one parsed index instead of re-reading the JSON
+    _shared = {}
+
     def __init__(self, haplotree_path: str = "ftdna_haplotree.json"):
         """Load the FTDNA haplotree data."""
         self.haplotree_path = haplotree_path
@@ -19,37 +60,252 @@ class Haplotree:
         self.name_to_id = {}
         self._loaded = False
 
+        # Indexed structure-of-arrays layout built at load time: dense node
+        # indexes into parallel id/name/parent arrays, so the hot ancestry
+        # walk is integer chasing instead of string-keyed dict lookups
+        self._ids = []
+        self._names = []
+        self._parent = []
+        self._idx_of = {}
+        self._name_to_idx = {}
+        self._canon_to_idx = {}
+        self._path_cache = {}
+        self._depth = []
+        self._enter = []
+        self._exit = []
+        self._roots_histogram = {}
+
     def _ensure_loaded(self):
         """Lazy load the haplotree data."""
         if self._loaded:
             return
 
+        loaded = Haplotree._shared.get(self.haplotree_path)
+        if loaded is not None:
+            self._adopt(loaded)
+            self._loaded = True
+            return
+
+        if self._load_cache():
+            Haplotree._shared[self.haplotree_path] = self
+            self._loaded = True
+            print(f"Loaded {len(self.nodes)} haplogroups from FTDNA haplotree (cached)")
+            return
+
         try:
-            with open(self.haplotree_path, 'r') as f:
-                data = json.load(f)
+            with open(self.haplotree_path, 'rb') as f:
+                data = _loads(f.read())
             self.nodes = data.get('allNodes', {})
 
-            # Build name lookup index
+            # Build name lookup index; interned names make every later
+            # equality/hash a pointer op and dedupe against the index arrays
             for hid, node in self.nodes.items():
                 name = node.get('name', '')
                 if name:
-                    self.name_to_id[name] = hid
+                    self.name_to_id[sys.intern(name)] = hid
+
+            self._build_index()
+            self._save_cache()
 
+            Haplotree._shared[self.haplotree_path] = self
             self._loaded = True
             print(f"Loaded {len(self.nodes)} haplogroups from FTDNA haplotree")
         except FileNotFoundError:
             print(f"Haplotree file not found: {self.haplotree_path}")
             print("Download with: wget https://www.familytreedna.com/public/y-dna-haplotree/get -O ftdna_haplotree.json")
-        except json.JSONDecodeError as e:
+        except (json.JSONDecodeError, ValueError) as e:
             print(f"Error parsing haplotree JSON: {e}")
 
+    def _adopt(self, other: "Haplotree"):
+        """Share another instance's parsed nodes and built index.
+
+        The tree is immutable after load, so references (including the
+        growing path cache) are safe to share between instances.
+        """
+        self.nodes = other.nodes
+        self.name_to_id = other.name_to_id
+        self._ids = other._ids
+        self._names = other._names
+        self._parent = other._parent
+        self._idx_of = other._idx_of
+        self._name_to_idx = other._name_to_idx
+        self._canon_to_idx = other._canon_to_idx
+        self._path_cache = other._path_cache
+        self._depth = other._depth
+        self._enter = other._enter
+        self._exit = other._exit
+        self._roots_histogram = other._roots_histogram
+
+    def _cache_path(self) -> str:
+        return f"{self.haplotree_path}.cache.pkl"
+
+    def _load_cache(self) -> bool:
+        """Load the pickled index if it is current; returns True on success.
+
+        unpickling the prebuilt dicts and arrays is many times faster than
+        re-parsing the FTDNA JSON and rebuilding the index on every startup.
+        """
+        cache_path = self._cache_path()
+        try:
+            if os.path.getmtime(cache_path) < os.path.getmtime(self.haplotree_path):
+                return False
+            with open(cache_path, 'rb') as f:
+                cached = pickle.load(f)
+            if cached.get('version') != _CACHE_VERSION:
+                return False
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return False
+
+        self.nodes = cached['nodes']
+        self.name_to_id = cached['name_to_id']
+        self._ids = cached['ids']
+        self._names = cached['names']
+        self._parent = cached['parent']
+        self._idx_of = cached['idx_of']
+        self._name_to_idx = cached['name_to_idx']
+        self._canon_to_idx = cached['canon_to_idx']
+        self._depth = cached['depth']
+        self._enter = cached['enter']
+        self._exit = cached['exit']
+        self._roots_histogram = cached['roots_histogram']
+        self._path_cache = {}
+        return True
+
+    def _save_cache(self):
+        """Write the parsed nodes and built index next to the JSON file."""
+        cached = {
+            'version': _CACHE_VERSION,
+            'nodes': self.nodes,
+            'name_to_id': self.name_to_id,
+            'ids': self._ids,
+            'names': self._names,
+            'parent': self._parent,
+            'idx_of': self._idx_of,
+            'name_to_idx': self._name_to_idx,
+            'canon_to_idx': self._canon_to_idx,
+            'depth': self._depth,
+            'enter': self._enter,
+            'exit': self._exit,
+            'roots_histogram': self._roots_histogram,
+        }
+        try:
+            with open(self._cache_path(), 'wb') as f:
+                pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError:
+            # Cache is an optimization only; a read-only directory is fine
+            pass
+
+    def _build_index(self):
+        """Build the flat id/name/parent arrays from the parsed node dicts."""
+        ids = list(self.nodes.keys())
+        idx_of = {hid: i for i, hid in enumerate(ids)}
+
+        names = []
+        parent = []
+        for hid in ids:
+            node = self.nodes[hid]
+            names.append(sys.intern(node.get('name', '')))
+            parent_id = node.get('parentId')
+            pidx = idx_of.get(str(parent_id)) if parent_id is not None else None
+            # Roots (missing or self-referencing parent) get -1
+            if pidx is None or ids[pidx] == hid:
+                parent.append(-1)
+            else:
+                parent.append(pidx)
+
+        # One iterative DFS gives each node its depth and an enter/exit
+        # interval (Euler-tour style), so LCA distances come from depth
+        # subtraction and subtree tests from two integer comparisons
+        n = len(ids)
+        children = [[] for _ in range(n)]
+        roots = []
+        for i, p in enumerate(parent):
+            if p < 0:
+                roots.append(i)
+            else:
+                children[p].append(i)
+
+        depth = [0] * n
+        enter = [0] * n
+        exit_ = [0] * n
+        visited = [False] * n
+        clock = 0
+
+        def walk(start):
+            nonlocal clock
+            stack = [(start, False)]
+            while stack:
+                node, done = stack.pop()
+                if done:
+                    exit_[node] = clock
+                    clock += 1
+                    continue
+                visited[node] = True
+                enter[node] = clock
+                clock += 1
+                stack.append((node, True))
+                for child in children[node]:
+                    if not visited[child]:
+                        depth[child] = depth[node] + 1
+                        stack.append((child, False))
+
+        for root in roots:
+            walk(root)
+
+        # Anything the root DFS never reached sits on a malformed multi-node
+        # parentId cycle; sever its parent edge and walk it as an extra root
+        # so every parent chain terminates at -1 and the array walks in
+        # get_ancestry_path/_lca_idx cannot loop forever
+        for i in range(n):
+            if not visited[i]:
+                parent[i] = -1
+                walk(i)
+
+        self._ids = ids
+        self._names = names
+        self._parent = parent
+        self._idx_of = idx_of
+        self._name_to_idx = {name: i for i, name in enumerate(names) if name}
+        # Secondary index under a folded key (upper-case, trailing '*'
+        # stripped) so retried spellings like "r-m269" or "R-M269*" still
+        # resolve in O(1); exact names win on collision
+        canon = {}
+        for name, i in self._name_to_idx.items():
+            canon.setdefault(name.upper().rstrip('*'), i)
+        self._canon_to_idx = canon
+        self._path_cache = {}
+        self._depth = depth
+        self._enter = enter
+        self._exit = exit_
+
+        # The tree is immutable after load, so the per-root node counts are
+        # computed once here instead of on every get_statistics call
+        histogram = {}
+        for node in self.nodes.values():
+            root = node.get('root', 'Unknown')
+            histogram[root] = histogram.get(root, 0) + 1
+        self._roots_histogram = histogram
+
+    def _resolve_idx(self, name: str) -> Optional[int]:
+        """Resolve a haplogroup name to its node index.
+
+        Exact names resolve directly; near-miss spellings ('r-m269',
+        'R-M269*') fall back to the case-folded index. Every name-taking
+        lookup goes through here so they all accept the same spellings.
+        Callers must have loaded the tree.
+        """
+        idx = self._name_to_idx.get(name)
+        if idx is None and name:
+            idx = self._canon_to_idx.get(name.upper().rstrip('*'))
+        return idx
+
     def find_by_name(self, name: str) -> Optional[dict]:
         """Find a haplogroup by its name (e.g., 'R-M269')."""
         self._ensure_loaded()
-        hid = self.name_to_id.get(name)
-        if hid:
-            return self.nodes.get(hid)
-        return None
+        idx = self._resolve_idx(name)
+        if idx is None:
+            return None
+        return self.nodes.get(self._ids[idx])
 
     def get_ancestry_path(self, name: str) -> list:
         """
@@ -59,58 +315,155 @@ class Haplotree:
         """
         self._ensure_loaded()
 
-        hid = self.name_to_id.get(name)
-        if not hid:
+        idx = self._resolve_idx(name)
+        if idx is None:
             return []
 
-        path = []
-        current_id = hid
-        visited = set()
-
-        while current_id and str(current_id) not in visited:
-            visited.add(str(current_id))
-            node = self.nodes.get(str(current_id))
-            if not node:
-                break
-            path.append((str(current_id), node.get('name', '')))
-            parent_id = node.get('parentId')
-            if not parent_id or str(parent_id) == str(current_id):
-                break
-            current_id = str(parent_id)
+        cached = self._path_cache.get(idx)
+        if cached is None:
+            # Tight walk over the parent-index array; the tree is immutable
+            # after load, so results are cached. The walk stops at the first
+            # ancestor whose path is already cached and then back-fills a
+            # suffix for every node it passed, so overlapping queries share
+            # most of the work.
+            cache = self._path_cache
+            path = []
+            walked = []
+            ids = self._ids
+            names = self._names
+            parent = self._parent
+            i = idx
+            while i >= 0:
+                hit = cache.get(i)
+                if hit is not None:
+                    path.extend(hit)
+                    break
+                walked.append(i)
+                path.append((ids[i], names[i]))
+                i = parent[i]
+            for k, j in enumerate(walked):
+                cache[j] = path[k:]
+            cached = path
+
+        return list(cached)
+
+    def get_ancestry_path_truncated(self, name: str, limit: int) -> Tuple[list, int]:
+        """
+        Get the first `limit` steps of the ancestry path plus the total depth.
 
-        return path
+        Builds (id, name) tuples only for the entries the caller will show;
+        the rest of the walk is bare integer chasing to count the depth.
+        Returns ([], 0) for unknown haplogroups.
+        """
+        self._ensure_loaded()
+
+        idx = self._resolve_idx(name)
+        if idx is None:
+            return [], 0
 
-    def find_common_ancestor(self, name1: str, name2: str) -> Optional[dict]:
+        cached = self._path_cache.get(idx)
+        if cached is not None:
+            return cached[:limit], len(cached)
+
+        path = []
+        ids = self._ids
+        names = self._names
+        parent = self._parent
+        depth = 0
+        i = idx
+        while i >= 0:
+            if depth < limit:
+                path.append((ids[i], names[i]))
+            depth += 1
+            i = parent[i]
+
+        return path, depth
+
+    def _lca_idx(self, i: int, j: int) -> int:
+        """
+        Lowest common ancestor of two node indexes, or -1 if disconnected.
+
+        Equalizes depths over the parent array, then steps both sides up in
+        lockstep - integer chasing only, no path lists or sets.
+        """
+        depth = self._depth
+        parent = self._parent
+
+        di = depth[i]
+        dj = depth[j]
+        while di > dj:
+            i = parent[i]
+            di -= 1
+        while dj > di:
+            j = parent[j]
+            dj -= 1
+        while i != j:
+            i = parent[i]
+            j = parent[j]
+            if i < 0 or j < 0:
+                return -1
+        return i
+
+    def find_common_ancestor(self, name1: str, name2: str) -> Optional[LCAResult]:
         """
         Find the most recent common ancestor of two haplogroups.
 
-        Returns dict with:
+        Returns an LCAResult with:
             - name: Common ancestor haplogroup name
             - distance1: Steps from name1 to common ancestor
             - distance2: Steps from name2 to common ancestor
             - total_distance: Total genetic distance between the two
         """
-        path1 = self.get_ancestry_path(name1)
-        path2 = self.get_ancestry_path(name2)
+        self._ensure_loaded()
+
+        i = self._resolve_idx(name1)
+        j = self._resolve_idx(name2)
+        if i is None or j is None:
+            return None
 
-        if not path1 or not path2:
+        lca = self._lca_idx(i, j)
+        if lca < 0:
             return None
 
-        set1 = {hid for hid, _ in path1}
+        distance1 = self._depth[i] - self._depth[lca]
+        distance2 = self._depth[j] - self._depth[lca]
+        return LCAResult(self._names[lca], self._ids[lca],
+                         distance1, distance2, distance1 + distance2)
 
-        for i, (hid, name) in enumerate(path2):
-            if hid in set1:
-                # Find position in path1
-                pos1 = next(j for j, (h, _) in enumerate(path1) if h == hid)
-                return {
-                    'name': name,
-                    'id': hid,
-                    'distance1': pos1,
-                    'distance2': i,
-                    'total_distance': pos1 + i
-                }
+    def find_common_ancestors_batch(self, pairs) -> list:
+        """
+        Find common ancestors for many haplogroup pairs in one call.
 
-        return None
+        pairs is an iterable of (name1, name2) tuples; returns one
+        LCAResult (or None) per pair in order. Duplicate pairs - common
+        when comparing kit lists - resolve the LCA walk only once.
+        """
+        self._ensure_loaded()
+
+        resolve = self._resolve_idx
+        depth = self._depth
+        lca_memo = {}
+        results = []
+        for name1, name2 in pairs:
+            i = resolve(name1)
+            j = resolve(name2)
+            if i is None or j is None:
+                results.append(None)
+                continue
+
+            key = (i, j) if i <= j else (j, i)
+            lca = lca_memo.get(key)
+            if lca is None:
+                lca = lca_memo[key] = self._lca_idx(i, j)
+            if lca < 0:
+                results.append(None)
+                continue
+
+            distance1 = depth[i] - depth[lca]
+            distance2 = depth[j] - depth[lca]
+            results.append(LCAResult(self._names[lca], self._ids[lca],
+                                     distance1, distance2, distance1 + distance2))
+        return results
 
     def are_related(self, name1: str, name2: str, max_distance: int = 10) -> bool:
         """
@@ -120,13 +473,52 @@ class Haplotree:
             name1: First haplogroup name
             name2: Second haplogroup name
             max_distance: Maximum steps between them to consider related
+                (None means any shared ancestor counts)
 
         Returns True if they share a common ancestor within max_distance steps.
+
+        Walks at most max_distance parent steps instead of resolving the
+        full LCA, so a typical max_distance=10 query touches ten nodes even
+        when the haplogroups sit 30-40 levels deep.
         """
-        result = self.find_common_ancestor(name1, name2)
-        if not result:
+        self._ensure_loaded()
+
+        i = self._resolve_idx(name1)
+        j = self._resolve_idx(name2)
+        if i is None or j is None:
             return False
-        return result['total_distance'] <= max_distance
+
+        if max_distance is None:
+            return self._lca_idx(i, j) >= 0
+
+        depth = self._depth
+        parent = self._parent
+        di = depth[i]
+        dj = depth[j]
+        # The total distance is at least the depth gap plus two per
+        # lockstep round, so the budget bounds the whole walk
+        budget = max_distance
+        while di > dj:
+            if budget <= 0:
+                return False
+            i = parent[i]
+            di -= 1
+            budget -= 1
+        while dj > di:
+            if budget <= 0:
+                return False
+            j = parent[j]
+            dj -= 1
+            budget -= 1
+        while i != j:
+            if budget < 2:
+                return False
+            i = parent[i]
+            j = parent[j]
+            if i < 0 or j < 0:
+                return False
+            budget -= 2
+        return True
 
     def is_downstream_of(self, child: str, ancestor: str) -> bool:
         """
@@ -138,17 +530,16 @@ class Haplotree:
 
         Returns True if child is downstream of ancestor.
         """
-        path = self.get_ancestry_path(child)
-        ancestor_id = self.name_to_id.get(ancestor)
+        self._ensure_loaded()
 
-        if not ancestor_id:
+        c = self._resolve_idx(child)
+        a = self._resolve_idx(ancestor)
+        if c is None or a is None:
             return False
 
-        for hid, _ in path:
-            if hid == ancestor_id:
-                return True
-
-        return False
+        # Subtree containment over the DFS enter/exit intervals: two integer
+        # comparisons instead of walking the whole chain to the root
+        return self._enter[a] <= self._enter[c] <= self._exit[a]
 
     def get_snp_info(self, name: str) -> list:
         """
@@ -176,19 +567,19 @@ class Haplotree:
             'haplogroup2': name2,
             'path1': [name for _, name in path1],
             'path2': [name for _, name in path2],
-            'common_ancestor': common,
+            'common_ancestor': common.to_dict() if common else None,
             'relationship': 'unknown'
         }
 
         if common:
-            if common['distance1'] == 0:
+            if common.distance1 == 0:
                 result['relationship'] = f'{name1} is ancestor of {name2}'
-            elif common['distance2'] == 0:
+            elif common.distance2 == 0:
                 result['relationship'] = f'{name2} is ancestor of {name1}'
-            elif common['distance1'] == 1 and common['distance2'] == 1:
-                result['relationship'] = f'siblings (share parent {common["name"]})'
+            elif common.distance1 == 1 and common.distance2 == 1:
+                result['relationship'] = f'siblings (share parent {common.name})'
             else:
-                result['relationship'] = f'cousins (share {common["name"]} at {common["total_distance"]} steps)'
+                result['relationship'] = f'cousins (share {common.name} at {common.total_distance} steps)'
 
         return result
 
@@ -199,23 +590,28 @@ class Haplotree:
         if not self.nodes:
             return {'loaded': False}
 
-        # Count by root haplogroup
-        roots = {}
-        for node in self.nodes.values():
-            root = node.get('root', 'Unknown')
-            roots[root] = roots.get(root, 0) + 1
-
         return {
             'loaded': True,
             'total_haplogroups': len(self.nodes),
-            'by_root': roots
+            'by_root': self._roots_histogram
         }
 
 
+_default_tree: Optional[Haplotree] = None
+
+
+def get_default_tree() -> Haplotree:
+    """Return the shared module-level Haplotree, constructing it lazily."""
+    global _default_tree
+    if _default_tree is None:
+        _default_tree = Haplotree()
+    return _default_tree
+
+
 def print_comparison(name1: str, name2: str, tree: Haplotree = None):
     """Print a formatted comparison between two haplogroups."""
     if tree is None:
-        tree = Haplotree()
+        tree = get_default_tree()
 
     comparison = tree.compare_haplogroups(name1, name2)
 
@@ -5,54 +5,130 @@ Core logic for traversing paternal lines and propagating Y-DNA haplogroups.
 """
 
 import json
-import time
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
 from typing import Optional
 
 from geni_client import GeniClient
 from database import Database
 
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+# Per-call diagnostics ([Fetching ...], rate-limit waits) go through this
+# logger at DEBUG so the default run skips both the syscall and the f-string
+# formatting; enable with logging.basicConfig(level=logging.DEBUG)
+log = logging.getLogger("propagator")
+
+
+class _ProgressBuffer:
+    """Batch per-node progress lines into one stdout write per flush.
+
+    Traversals over large trees emit one line per profile; print() pays a
+    lock acquire and flush per call, so hot loops buffer lines instead.
+    """
+
+    def __init__(self, flush_every: int = 1000):
+        self._lines = []
+        self._flush_every = flush_every
+
+    def write(self, line: str):
+        self._lines.append(line)
+        if len(self._lines) >= self._flush_every:
+            self.flush()
+
+    def flush(self):
+        if self._lines:
+            sys.stdout.write("\n".join(self._lines) + "\n")
+            self._lines.clear()
+
+
+# Profiles per combined immediate-family request; keeps the comma-joined
+# URL well under length limits while still collapsing a generation's worth
+# of round-trips into a few calls
+_FAMILY_BATCH_SIZE = 25
+
+# Concurrent batch requests in flight during a frontier fetch; the client's
+# shared sliding-window limiter keeps the combined rate within Geni's cap
+_FAMILY_FETCH_WORKERS = 4
+
+# Node-ID prefixes from Geni responses; checked thousands of times per run
+# while partitioning family nodes, so the slice comparisons below beat the
+# equivalent startswith() method dispatch
+_PROFILE_PREFIX = "profile-"
+_UNION_PREFIX = "union-"
+
 
 def get_name(profile: dict) -> str:
-    """Get display name from profile."""
-    if profile.get("display_name"):
-        return profile["display_name"]
-    if profile.get("name"):
-        return profile["name"]
-    parts = []
-    if profile.get("first_name"):
-        parts.append(profile["first_name"])
-    if profile.get("last_name"):
-        parts.append(profile["last_name"])
-    return " ".join(parts) if parts else "Unknown"
+    """Get display name from profile.
+
+    Nearly every Geni profile carries display_name, so that path returns
+    after a single lookup; the first/last fallback avoids building a parts
+    list in what is a per-node call during traversal printing.
+    """
+    name = profile.get("display_name")
+    if name:
+        return name
+    name = profile.get("name")
+    if name:
+        return name
+    first = profile.get("first_name")
+    last = profile.get("last_name")
+    if first and last:
+        return f"{first} {last}"
+    return first or last or "Unknown"
 
 
 class YDNAPropagator:
     """Engine for traversing paternal lines and propagating Y-DNA haplogroups."""
 
     def __init__(self, config_path: str = "config.json"):
-        with open(config_path, "r") as f:
-            self.config = json.load(f)
+        with open(config_path, "rb") as f:
+            self.config = _loads(f.read())
 
         self.client = GeniClient(config_path)
         self.db = Database(self.config["database"]["path"])
         self.max_gen_up = self.config["propagation"]["max_generations_up"]
         self.max_gen_down = self.config["propagation"]["max_generations_down"]
 
-        # Rate limiting - geni.com has strict limits
-        self.request_delay = self.config.get("rate_limit", {}).get("delay", 2.0)
-        self.last_request_time = 0
-
-    def _rate_limit(self):
-        """Ensure we don't exceed API rate limits."""
-        elapsed = time.time() - self.last_request_time
-        if elapsed < self.request_delay:
-            wait = self.request_delay - elapsed
-            print(f"    [Rate limit: waiting {wait:.1f}s]", flush=True)
-            time.sleep(wait)
-        self.last_request_time = time.time()
+        # Families fetched within this many days are served from the local
+        # DB on later full-tree runs instead of being re-downloaded
+        self.family_refresh_days = self.config["propagation"].get("family_refresh_days", 30)
+
+        # Per-run memoization of resolved relatives: ancestors shared by
+        # many branches (and confirmed dead ends) are resolved once instead
+        # of re-querying the DB - or worse, re-fetching from Geni - on every
+        # revisit. Cleared at the start of each propagation run.
+        self._father_cache = {}
+        self._sons_cache = {}
+
+        # Working set for the current propagation run: every known
+        # (profile_id, haplogroup) pair, preloaded in one scan so conflict
+        # checks are set lookups. None outside propagate_full_tree.
+        self._assigned_pairs = None
+
+        # IDs already written this run; family responses overlap heavily
+        # (a father reappears in every son's family), so each profile and
+        # union is serialized and upserted at most once per run
+        self._saved_ids = set()
+        self._saved_union_ids = set()
+
+        # Set when any family fetch errors out during a run; failed fetches
+        # degrade to empty son lists, so a drained BFS may still be missing
+        # subtrees and must not be recorded as a complete closure
+        self._fetch_failed = False
+
+    def is_authenticated(self) -> bool:
+        """Check for a valid cached token without touching the network."""
+        return self.client.is_authenticated()
 
     def authenticate(self, auth_code: str = None) -> bool:
-        """Authenticate with Geni API."""
+        """Authenticate with Geni API (no-op when a valid cached token exists)."""
         return self.client.authenticate(auth_code)
 
     def fetch_and_save_profile(self, profile_id: str) -> Optional[dict]:
@@ -66,53 +142,132 @@ class YDNAPropagator:
         if existing:
             return existing
 
-        self._rate_limit()
-
         try:
-            print(f"    [Fetching profile: {profile_id}]", flush=True)
+            log.debug("Fetching profile: %s", profile_id)
             profile_data = self.client.get_profile(profile_id)
-            self.db.save_profile(profile_data)
-            name = get_name(profile_data)
-            print(f"    [Saved: {name}]", flush=True)
+            self._save_profile_once(profile_data)
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Saved: %s", get_name(profile_data))
             return profile_data
         except Exception as e:
             print(f"    [Error fetching profile {profile_id}: {e}]")
             return None
 
+    def _save_profile_once(self, profile: dict):
+        """Save a profile unless it was already written this run."""
+        profile_id = profile.get("id")
+        if profile_id and profile_id in self._saved_ids:
+            return
+        self.db.save_profile(profile)
+        if profile_id:
+            self._saved_ids.add(profile_id)
+
     def fetch_immediate_family(self, profile_id: str) -> dict:
         """
         Fetch immediate family and save all profiles/unions to database.
 
         Returns dict with parsed family relationships.
         """
-        print(f"    [Fetching family: {profile_id}]", flush=True)
-        self._rate_limit()
+        log.debug("Fetching family: %s", profile_id)
 
         try:
             family_data = self.client.get_immediate_family(profile_id)
         except Exception as e:
             print(f"    [Error fetching family for {profile_id}: {e}]")
+            self._fetch_failed = True
             return {}
 
+        return self._parse_family(family_data, profile_id)
+
+    def fetch_immediate_family_many(self, profile_ids) -> dict:
+        """
+        Fetch immediate family for a whole frontier of profiles at once.
+
+        Issues one combined API request (and pays one rate-limit wait) per
+        _FAMILY_BATCH_SIZE profiles instead of one per profile, then parses
+        and saves each family exactly like fetch_immediate_family.
+
+        Returns a dict mapping each requested profile ID to its parsed
+        family relationships (missing/failed IDs map to {}).
+        """
+        families = {}
+        ids = list(profile_ids)
+        chunks = [ids[start:start + _FAMILY_BATCH_SIZE]
+                  for start in range(0, len(ids), _FAMILY_BATCH_SIZE)]
+
+        if len(chunks) == 1:
+            print(f"    [Fetching families: {len(ids)} profiles]", flush=True)
+            self._fetch_family_chunk(chunks[0], families)
+            return families
+
+        # Fan the chunks out over a small thread pool: network round-trips
+        # overlap while the client's sliding-window limiter bounds the
+        # combined request rate, so the per-call delay is not paid serially.
+        # Parsing and DB writes stay on this thread.
+        print(f"    [Fetching families: {len(ids)} profiles in {len(chunks)} batches]",
+              flush=True)
+        with ThreadPoolExecutor(max_workers=_FAMILY_FETCH_WORKERS) as pool:
+            futures = {pool.submit(self.client.get_immediate_family_batch, chunk): chunk
+                       for chunk in chunks}
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    print(f"    [Error fetching family batch: {e}]")
+                    self._fetch_failed = True
+                    # One bad ID fails the combined request; retry singly so
+                    # the rest of the chunk still resolves
+                    for pid in chunk:
+                        families[pid] = self.fetch_immediate_family(pid)
+                    continue
+                for pid, family_data in zip(chunk, results):
+                    families[pid] = self._parse_family(family_data or {}, pid)
+        return families
+
+    def _fetch_family_chunk(self, chunk: list, families: dict):
+        """Fetch one batched chunk into families, falling back to single fetches."""
+        try:
+            results = self.client.get_immediate_family_batch(chunk)
+        except Exception as e:
+            print(f"    [Error fetching family batch: {e}]")
+            self._fetch_failed = True
+            for pid in chunk:
+                families[pid] = self.fetch_immediate_family(pid)
+            return
+        for pid, family_data in zip(chunk, results):
+            families[pid] = self._parse_family(family_data or {}, pid)
+
+    def _parse_family(self, family_data: dict, profile_id: str) -> dict:
+        """Save the profiles/unions in a family response and extract relationships."""
         nodes = family_data.get("nodes", {})
         focus = family_data.get("focus", {})
 
-        # Save the focus profile
-        if focus:
-            self.db.save_profile(focus)
-
-        # Parse and save all nodes
+        # Collect all nodes first, then save each kind in one transaction
+        # instead of paying a commit per node
         profiles = {}
         unions = {}
 
         for node_id, node_data in nodes.items():
-            if node_id.startswith("profile-"):
-                self.db.save_profile(node_data)
+            if node_id[:8] == _PROFILE_PREFIX:
                 profiles[node_id] = node_data
-            elif node_id.startswith("union-"):
-                self.db.save_union(node_data)
+            elif node_id[:6] == _UNION_PREFIX:
                 unions[node_id] = node_data
 
+        seen = self._saved_ids
+        to_save = [p for p in profiles.values() if p.get("id") not in seen]
+        if focus and focus.get("id") not in seen:
+            to_save.append(focus)
+        if to_save:
+            self.db.save_profiles(to_save)
+            seen.update(p["id"] for p in to_save if p.get("id"))
+
+        new_unions = [u for u in unions.values()
+                      if u.get("id") not in self._saved_union_ids]
+        if new_unions:
+            self.db.save_unions(new_unions)
+            self._saved_union_ids.update(u["id"] for u in new_unions if u.get("id"))
+
         # Extract family relationships from edges
         result = {
             "focus": focus,
@@ -123,8 +278,8 @@ class YDNAPropagator:
         }
 
         focus_id = focus.get("id") if focus else profile_id
-        if not focus_id.startswith("profile-"):
-            focus_id = f"profile-{focus_id}"
+        if focus_id and focus_id[:8] != _PROFILE_PREFIX:
+            focus_id = _PROFILE_PREFIX + focus_id
 
         # Get focus profile's edges to find which unions they belong to
         focus_node = profiles.get(focus_id, {})
@@ -133,47 +288,49 @@ class YDNAPropagator:
         # Find unions where focus is a child (to find parents)
         # Find unions where focus is a partner (to find children)
         for union_id, edge_info in focus_edges.items():
-            if not union_id.startswith("union-"):
+            if union_id[:6] != _UNION_PREFIX:
                 continue
 
-            union_node = unions.get(union_id, {})
-            union_edges = union_node.get("edges", {})
-
-            if edge_info.get("rel") == "child":
-                # Focus is a child in this union - find the partners (parents)
-                for profile_id_in_union, rel_info in union_edges.items():
-                    if profile_id_in_union.startswith("profile-") and rel_info.get("rel") == "partner":
-                        if profile_id_in_union in profiles:
-                            result["parents"].append(profiles[profile_id_in_union])
-
-            elif edge_info.get("rel") == "partner":
-                # Focus is a partner in this union - find children and other partners
-                for profile_id_in_union, rel_info in union_edges.items():
-                    if not profile_id_in_union.startswith("profile-"):
-                        continue
-                    if profile_id_in_union == focus_id:
-                        continue
-
-                    if rel_info.get("rel") == "child":
-                        if profile_id_in_union in profiles:
-                            result["children"].append(profiles[profile_id_in_union])
-                    elif rel_info.get("rel") == "partner":
-                        if profile_id_in_union in profiles:
-                            result["partners"].append(profiles[profile_id_in_union])
+            # One pass over the union's edges partitions its members by rel
+            # (membership in the profiles dict already implies the
+            # "profile-" prefix); the dispatch below is pure list handling
+            union_partners = []
+            union_children = []
+            union_edges = unions.get(union_id, {}).get("edges", {})
+            for member_id, rel_info in union_edges.items():
+                member = profiles.get(member_id)
+                if member is None:
+                    continue
+                rel = rel_info.get("rel")
+                if rel == "partner":
+                    union_partners.append((member_id, member))
+                elif rel == "child":
+                    union_children.append(member)
+
+            rel = edge_info.get("rel")
+            if rel == "child":
+                # Focus is a child in this union - the partners are parents
+                result["parents"].extend(member for _, member in union_partners)
+            elif rel == "partner":
+                # Focus is a partner in this union - collect children and
+                # the other partners
+                result["children"].extend(union_children)
+                result["partners"].extend(member for member_id, member in union_partners
+                                          if member_id != focus_id)
 
         return result
 
     def _extract_id(self, ref) -> str:
         """Extract profile ID from various reference formats."""
         if isinstance(ref, str):
-            if ref.startswith("profile-"):
+            # Already-prefixed API IDs are by far the most common input
+            if ref[:8] == _PROFILE_PREFIX:
                 return ref
-            elif "/" in ref:
+            if "/" in ref:
                 # URL format
-                return ref.split("/")[-1]
-            else:
-                return f"profile-{ref}"
-        elif isinstance(ref, dict):
+                return ref.rsplit("/", 1)[-1]
+            return _PROFILE_PREFIX + ref
+        if isinstance(ref, dict):
             return ref.get("id", "")
         return ""
 
@@ -183,9 +340,15 @@ class YDNAPropagator:
 
         First checks local DB, then fetches from Geni if needed.
         """
-        # Check local DB first
+        # Check per-run cache first; a cached None records a confirmed dead
+        # end so the API fetch is not repeated on revisits
+        if profile_id in self._father_cache:
+            return self._father_cache[profile_id]
+
+        # Check local DB next
         father = self.db.get_father(profile_id)
         if father:
+            self._father_cache[profile_id] = father
             return father
 
         # Fetch from Geni
@@ -198,18 +361,20 @@ class YDNAPropagator:
 
         # Ensure child profile is saved first
         if focus:
-            self.db.save_profile(focus)
+            self._save_profile_once(focus)
 
         # Find the male parent
         for parent in parents:
             if parent.get("gender") == "male":
                 parent_id = parent.get("id")
                 # Save parent profile before creating link
-                self.db.save_profile(parent)
+                self._save_profile_once(parent)
                 # Create paternal link using actual IDs
                 self.db.add_paternal_link(parent_id, actual_child_id)
+                self._father_cache[profile_id] = parent
                 return parent
 
+        self._father_cache[profile_id] = None
         return None
 
     def get_sons(self, profile_id: str, force_fetch: bool = False) -> list:
@@ -222,10 +387,16 @@ class YDNAPropagator:
 
         First checks local DB, then fetches from Geni if needed.
         """
+        cache_key = (profile_id, force_fetch)
+        cached = self._sons_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         # Check local DB first (unless force_fetch)
         if not force_fetch:
             sons = self.db.get_sons(profile_id)
             if sons:
+                self._sons_cache[cache_key] = sons
                 return sons
 
         # Fetch from Geni
@@ -238,7 +409,7 @@ class YDNAPropagator:
 
         # Ensure parent profile exists in DB
         if focus:
-            self.db.save_profile(focus)
+            self._save_profile_once(focus)
 
         # Find male children
         sons = []
@@ -246,16 +417,78 @@ class YDNAPropagator:
             if child.get("gender") == "male":
                 child_id = child.get("id")
                 # Ensure child profile is saved before creating link
-                self.db.save_profile(child)
+                self._save_profile_once(child)
                 # Create paternal link using actual IDs
                 self.db.add_paternal_link(actual_parent_id, child_id)
                 sons.append(child)
 
+        # Stamp freshness only now that every son's link is persisted, and
+        # never for the empty dict a failed fetch falls back to; the window
+        # in propagate_full_tree relies on the stamp implying that
+        # db.get_sons returns the complete set
+        if family:
+            self.db.set_family_fetched(actual_parent_id)
+
+        self._sons_cache[cache_key] = sons
         return sons
 
+    def get_sons_many(self, profile_ids, force_fetch: bool = False) -> dict:
+        """
+        Resolve sons for a whole frontier of profiles at once.
+
+        Cache and DB hits are answered locally; the remainder goes through
+        one batched immediate-family fetch, and the discovered paternal
+        links are written in a single bulk insert.
+
+        Returns a dict mapping each profile ID to its list of sons.
+        """
+        sons_by_id = {}
+        missing = []
+        for pid in profile_ids:
+            cache_key = (pid, force_fetch)
+            cached = self._sons_cache.get(cache_key)
+            if cached is not None:
+                sons_by_id[pid] = cached
+                continue
+            if not force_fetch:
+                sons = self.db.get_sons(pid)
+                if sons:
+                    self._sons_cache[cache_key] = sons
+                    sons_by_id[pid] = sons
+                    continue
+            missing.append(pid)
+
+        if missing:
+            families = self.fetch_immediate_family_many(missing)
+            links = []
+            fetched = []
+            for pid in missing:
+                family = families.get(pid) or {}
+                focus = family.get("focus", {})
+                actual_parent_id = focus.get("id") if focus else pid
+                if family:
+                    fetched.append(actual_parent_id)
+                sons = []
+                for child in family.get("children", []):
+                    if child.get("gender") == "male":
+                        # Profiles were saved while parsing the family
+                        # response; only the link remains to record
+                        links.append((actual_parent_id, child.get("id")))
+                        sons.append(child)
+                self._sons_cache[(pid, force_fetch)] = sons
+                sons_by_id[pid] = sons
+            if links:
+                self.db.add_paternal_links(links)
+            # Stamp freshness only after the links are persisted (failed
+            # fetches stay unstamped); the window in propagate_full_tree
+            # relies on the stamp implying db.get_sons is complete
+            if fetched:
+                self.db.set_family_fetched_many(fetched)
+        return sons_by_id
+
     def traverse_paternal_line_up(self, start_profile_id: str,
                                    max_generations: int = None,
-                                   callback=None) -> list:
+                                   callback=None, visited: set = None) -> list:
         """
         Traverse paternal line upward (ancestors).
 
@@ -263,30 +496,40 @@ class YDNAPropagator:
             start_profile_id: Starting profile Geni ID
             max_generations: Maximum generations to traverse
             callback: Optional function called for each profile found
+            visited: Optional shared set of profile IDs already walked; lets
+                combined up+down propagation avoid re-walking the same edges
 
         Returns:
             List of ancestor profiles in order (father, grandfather, ...)
         """
         if max_generations is None:
             max_generations = self.max_gen_up
+        if visited is None:
+            visited = set()
 
         ancestors = []
         current_id = start_profile_id
         generation = 0
+        visited.add(start_profile_id)
 
         print(f"\nTraversing paternal line UP from {start_profile_id}")
+        progress = _ProgressBuffer()
 
         while generation < max_generations:
             father = self.get_father(current_id)
 
             if not father:
-                print(f"  Generation {generation}: No father found, end of line")
+                progress.write(f"  Generation {generation}: No father found, end of line")
                 break
 
             father_id = father.get("id") or father.get("geni_id")
+            if father_id in visited:
+                progress.write(f"  Generation {generation}: {father_id} already visited, stopping")
+                break
+            visited.add(father_id)
             father_name = get_name(father)
 
-            print(f"  Generation {generation + 1}: {father_name} ({father_id})")
+            progress.write(f"  Generation {generation + 1}: {father_name} ({father_id})")
             ancestors.append(father)
 
             if callback:
@@ -295,12 +538,13 @@ class YDNAPropagator:
             current_id = father_id
             generation += 1
 
+        progress.flush()
         print(f"Found {len(ancestors)} paternal ancestors")
         return ancestors
 
     def traverse_paternal_line_down(self, start_profile_id: str,
                                      max_generations: int = None,
-                                     callback=None) -> list:
+                                     callback=None, visited: set = None) -> list:
         """
         Traverse paternal line downward (descendants).
 
@@ -308,46 +552,100 @@ class YDNAPropagator:
             start_profile_id: Starting profile Geni ID
             max_generations: Maximum generations to traverse
             callback: Optional function called for each profile found
+            visited: Optional shared set of profile IDs already walked
 
         Returns:
             List of descendant dicts with profile and generation info
         """
         if max_generations is None:
             max_generations = self.max_gen_down
+        if visited is None:
+            visited = set()
 
         descendants = []
+        visited.add(start_profile_id)
 
         print(f"\nTraversing paternal line DOWN from {start_profile_id}")
+        progress = _ProgressBuffer()
+
+        # Generation-at-a-time BFS: the whole frontier's sons resolve in one
+        # batched call, and parent pointers replace the per-branch path list
+        # copies the old recursion allocated at every step
+        parent_of = {start_profile_id: None}
+
+        def build_path(son_id: str) -> list:
+            path = []
+            node = son_id
+            while node is not None:
+                path.append(node)
+                node = parent_of[node]
+            path.reverse()
+            return path
+
+        frontier = [start_profile_id]
+        generation = 1
+        while frontier and generation <= max_generations:
+            sons_by_id = self.get_sons_many(frontier)
+            next_frontier = []
+            for current_id in frontier:
+                for son in sons_by_id.get(current_id, []):
+                    son_id = son.get("id") or son.get("geni_id")
+                    if son_id in visited:
+                        continue
+                    visited.add(son_id)
+                    parent_of[son_id] = current_id
+                    son_name = get_name(son)
 
-        def traverse(current_id: str, generation: int, path: list):
-            if generation > max_generations:
-                return
+                    indent = "  " * generation
+                    progress.write(f"{indent}Generation {generation}: {son_name} ({son_id})")
 
-            sons = self.get_sons(current_id)
+                    descendants.append({
+                        "profile": son,
+                        "generation": generation,
+                        "path": build_path(son_id)
+                    })
 
-            for son in sons:
-                son_id = son.get("id") or son.get("geni_id")
-                son_name = get_name(son)
+                    if callback:
+                        callback(son, generation, "down")
 
-                indent = "  " * generation
-                print(f"{indent}Generation {generation}: {son_name} ({son_id})")
+                    next_frontier.append(son_id)
+            frontier = next_frontier
+            generation += 1
 
-                descendants.append({
-                    "profile": son,
-                    "generation": generation,
-                    "path": path + [son_id]
-                })
+        progress.flush()
+        print(f"Found {len(descendants)} paternal descendants")
+        return descendants
 
-                if callback:
-                    callback(son, generation, "down")
+    def traverse_paternal_line_down_iter(self, start_profile_id: str,
+                                          max_generations: int = None,
+                                          visited: set = None):
+        """
+        Stream paternal descendants as they are visited.
 
-                # Recursively traverse this son's line
-                traverse(son_id, generation + 1, path + [son_id])
+        Generator counterpart to traverse_paternal_line_down: yields profile
+        dicts one at a time (explicit stack, no recursion) so callers can
+        pipe them straight into a CSV writer without holding the whole
+        descendant list in memory.
+        """
+        if max_generations is None:
+            max_generations = self.max_gen_down
+        if visited is None:
+            visited = set()
+        visited.add(start_profile_id)
 
-        traverse(start_profile_id, 1, [start_profile_id])
+        stack = [(start_profile_id, 1)]
+        while stack:
+            current_id, generation = stack.pop()
+            if generation > max_generations:
+                continue
 
-        print(f"Found {len(descendants)} paternal descendants")
-        return descendants
+            for son in self.get_sons(current_id):
+                son_id = son.get("id") or son.get("geni_id")
+                if son_id in visited:
+                    continue
+                visited.add(son_id)
+                yield son
+                stack.append((son_id, generation + 1))
 
     def propagate_haplogroup(self, source_profile_id: str, haplogroup: str,
                               source: str = "FTDNA", propagate_up: bool = True,
@@ -423,11 +721,17 @@ class YDNAPropagator:
             else:
                 stats["descendants_propagated"] += 1
 
+        # One shared visited set so combined up+down propagation never walks
+        # the same profile twice
+        visited = set()
+
         if propagate_up:
-            self.traverse_paternal_line_up(source_profile_id, callback=propagation_callback)
+            self.traverse_paternal_line_up(source_profile_id, callback=propagation_callback,
+                                           visited=visited)
 
         if propagate_down:
-            self.traverse_paternal_line_down(source_profile_id, callback=propagation_callback)
+            self.traverse_paternal_line_down(source_profile_id, callback=propagation_callback,
+                                             visited=visited)
 
         print(f"\n{'='*60}")
         print(f"Propagation complete:")
@@ -446,6 +750,11 @@ class YDNAPropagator:
 
         Traverses both up and down to create a full tree structure.
         """
+        self._father_cache.clear()
+        self._sons_cache.clear()
+        self._saved_ids.clear()
+        self._saved_union_ids.clear()
+
         # First go up to find the most distant ancestor
         ancestors = self.traverse_paternal_line_up(root_profile_id)
 
@@ -480,7 +789,8 @@ class YDNAPropagator:
         }
 
     def propagate_full_tree(self, start_profile_id: str, haplogroup: str,
-                            source: str = "FTDNA", resume: bool = False) -> dict:
+                            source: str = "FTDNA", resume: bool = False,
+                            refresh_days: float = None) -> dict:
         """
         Propagate haplogroup from furthest ancestor to ALL male descendants.
 
@@ -493,6 +803,9 @@ class YDNAPropagator:
             haplogroup: Y-DNA haplogroup to propagate
             source: Source of the haplogroup data
             resume: If True, skip profiles already explored for this haplogroup
+            refresh_days: Serve sons from the local DB when a family was
+                fetched within this many days (0 forces re-download; default
+                comes from config)
 
         Returns:
             Dict with propagation statistics
@@ -507,6 +820,12 @@ class YDNAPropagator:
             "resumed": resume
         }
 
+        self._father_cache.clear()
+        self._sons_cache.clear()
+        self._saved_ids.clear()
+        self._saved_union_ids.clear()
+        self._fetch_failed = False
+
         print(f"\n{'='*60}")
         if resume:
             explored_count = self.db.get_explored_count(haplogroup)
@@ -532,63 +851,133 @@ class YDNAPropagator:
         root_name = get_name(root_profile) if root_profile else "Unknown"
         print(f"\nOldest ancestor: {root_name} ({root_id})")
 
+        # Preload the run's working set in two scans: all assignment pairs
+        # and this haplogroup's explored IDs. Per-node checks become set
+        # lookups instead of point queries.
+        self._assigned_pairs = self.db.get_assigned_pairs()
+        explored_ids = self.db.get_explored_set(haplogroup) if resume else set()
+
         # Propagate to the root
         self._assign_haplogroup(root_id, haplogroup, source, stats)
 
         # Always record tree membership (even if haplogroup was already assigned)
         self.db.add_tree_membership(root_id, haplogroup, generation=0, root_profile_id=root_id)
 
-        # Recursively propagate to ALL descendants
-        print(f"\nPropagating to all male descendants...")
-
-        def propagate_to_all_sons(profile_id: str, generation: int):
-            if generation > self.max_gen_down:
-                return
+        # A prior run that exhausted this whole tree lets a resume skip the
+        # descent outright instead of re-walking every known node
+        if resume and self.db.is_closure_complete(root_id, haplogroup, self.max_gen_down):
+            print(f"\nTree below {root_id} already fully explored for {haplogroup}; nothing to re-walk")
+            self._assigned_pairs = None
+            return stats
 
-            # Check if already explored (for resume)
-            if resume and self.db.is_explored(profile_id, haplogroup):
-                # Still need to recurse through known sons from database
+        # Propagate to ALL descendants, one generation at a time: each
+        # frontier's unexplored profiles resolve through one batched fetch
+        # instead of a recursive per-profile descent
+        print(f"\nPropagating to all male descendants...")
+        progress = _ProgressBuffer()
+
+        if refresh_days is None:
+            refresh_days = self.family_refresh_days
+        cutoff = None
+        if refresh_days:
+            cutoff = (datetime.utcnow() - timedelta(days=refresh_days)).isoformat()
+        # True once any frontier node is served from the freshness window;
+        # such runs never prove closure on their own
+        fresh_served = False
+
+        frontier = [root_id]
+        generation = 1
+        while frontier and generation <= self.max_gen_down:
+            indent = "  " * generation
+
+            # Split the frontier into already-explored profiles (resume) and
+            # profiles whose sons must be discovered from Geni
+            explored = set()
+            fetch_frontier = frontier
+            if resume:
+                fetch_frontier = []
+                for profile_id in frontier:
+                    if profile_id in explored_ids:
+                        explored.add(profile_id)
+                    else:
+                        fetch_frontier.append(profile_id)
+
+            sons_by_id = {}
+            for profile_id in explored:
                 sons = self.db.get_sons(profile_id)
                 if sons:
-                    indent = "  " * generation
-                    print(f"{indent}[Skipping explored: {profile_id}, checking {len(sons)} known sons]", flush=True)
+                    progress.write(f"{indent}[Skipping explored: {profile_id}, checking {len(sons)} known sons]")
                     stats["skipped_explored"] += 1
-                    for son in sons:
-                        son_id = son.get("geni_id") or son.get("id")
-                        # Ensure haplogroup is assigned
-                        self._assign_haplogroup(son_id, haplogroup, f"propagated_{source}", stats)
-                        # Always record tree membership
-                        self.db.add_tree_membership(son_id, haplogroup, generation=generation, root_profile_id=root_id)
-                        # Recurse
-                        propagate_to_all_sons(son_id, generation + 1)
-                return
-
-            # Fetch from Geni to discover ALL sons
-            sons = self.get_sons(profile_id, force_fetch=True)
-
-            # Mark this profile as explored
-            self.db.mark_explored(profile_id, haplogroup)
-
-            for son in sons:
-                son_id = son.get("id") or son.get("geni_id")
-                son_name = get_name(son)
-                indent = "  " * generation
-
-                # Assign haplogroup to this son
-                assigned = self._assign_haplogroup(son_id, haplogroup, f"propagated_{source}", stats)
-                status = "+" if assigned else "="
-                print(f"{indent}{status} Gen {generation}: {son_name} ({son_id})")
-
-                # Always record tree membership (tracks which profiles are in this tree)
-                self.db.add_tree_membership(son_id, haplogroup, generation=generation, root_profile_id=root_id)
-
-                # Recurse to this son's sons
-                propagate_to_all_sons(son_id, generation + 1)
+                sons_by_id[profile_id] = sons
+
+            # Families fetched recently enough resolve from the local DB
+            # instead of re-downloading the same sons
+            if fetch_frontier and cutoff is not None:
+                fresh_ids = self.db.get_family_fetched_since(fetch_frontier, cutoff)
+                if fresh_ids:
+                    fresh_served = True
+                    fetch_frontier = [pid for pid in fetch_frontier if pid not in fresh_ids]
+                    for profile_id in fresh_ids:
+                        sons_by_id[profile_id] = self.db.get_sons(profile_id)
+                        self.db.mark_explored(profile_id, haplogroup)
+                        explored_ids.add(profile_id)
+                    if generation > stats["generations"]:
+                        stats["generations"] = generation
+
+            if fetch_frontier:
+                # Fetch from Geni to discover ALL sons
+                sons_by_id.update(self.get_sons_many(fetch_frontier, force_fetch=True))
+                for profile_id in fetch_frontier:
+                    self.db.mark_explored(profile_id, haplogroup)
+                    explored_ids.add(profile_id)
+                if generation > stats["generations"]:
+                    stats["generations"] = generation
+
+            next_frontier = []
+            pending = {}
+            for profile_id in frontier:
+                from_explored = profile_id in explored
+                for son in sons_by_id.get(profile_id, []):
+                    son_id = son.get("id") or son.get("geni_id")
+
+                    # Queue the haplogroup for this son (flushed per generation)
+                    assigned = self._assign_haplogroup(son_id, haplogroup, f"propagated_{source}", stats,
+                                                       pending=pending)
+                    if not from_explored:
+                        son_name = get_name(son)
+                        status = "+" if assigned else "="
+                        progress.write(f"{indent}{status} Gen {generation}: {son_name} ({son_id})")
+
+                    # Always record tree membership (tracks which profiles are in this tree)
+                    self.db.add_tree_membership(son_id, haplogroup, generation=generation, root_profile_id=root_id)
+
+                    next_frontier.append(son_id)
+
+            # One transaction for the whole generation's assignments
+            if pending:
+                self.db.add_haplogroups_bulk(pending.values(), confidence="propagated")
+
+            # Show this generation's lines before the next round of fetches
+            progress.flush()
+
+            frontier = next_frontier
+            generation += 1
 
-            if generation > stats["generations"]:
-                stats["generations"] = generation
+        # The descent ran to exhaustion with every fetch answered, so later
+        # resumed runs can bypass the whole tree. Failed fetches degrade to
+        # empty son lists, and freshness-window hits trust stamps that may
+        # predate the stamp-after-links invariant, so a drained loop alone
+        # is not proof of closure in either case.
+        if self._fetch_failed:
+            print("\n  [Fetch errors during this run - closure not recorded; "
+                  "re-run with --resume to fill the gaps]")
+        elif fresh_served:
+            print("\n  [Some families came from the freshness window - "
+                  "closure not recorded; run with --refresh-days 0 to certify]")
+        else:
+            self.db.mark_closure_complete(root_id, haplogroup, self.max_gen_down)
 
-        propagate_to_all_sons(root_id, 1)
+        self._assigned_pairs = None
 
         print(f"\n{'='*60}")
         print(f"Full tree propagation complete:")
@@ -603,24 +992,40 @@ class YDNAPropagator:
         return stats
 
     def _assign_haplogroup(self, profile_id: str, haplogroup: str,
-                           source: str, stats: dict) -> bool:
-        """Helper to assign haplogroup and track statistics."""
-        # Check if this SPECIFIC haplogroup is already assigned to this profile
-        existing = self.db.get_profile_haplogroups(profile_id)
+                           source: str, stats: dict, pending: dict = None) -> bool:
+        """Helper to assign haplogroup and track statistics.
 
-        for hg in existing:
-            if hg["haplogroup"] == haplogroup:
-                # Already has this exact haplogroup
-                return False
+        When pending is given, the row is queued there (keyed by profile ID)
+        for a later bulk insert instead of being written immediately.
+        """
+        if pending is not None and profile_id in pending:
+            # Already queued in this batch
+            return False
 
-        # Add the haplogroup (allows multiple haplogroups per profile)
-        self.db.add_haplogroup(
-            profile_id,
-            haplogroup,
-            source,
-            is_tested=(source == "FTDNA" or source == "YFull"),
-            confidence="propagated" if "propagated" in source else "confirmed"
-        )
+        # Check if this SPECIFIC haplogroup is already assigned to this profile
+        if self._assigned_pairs is not None:
+            if (profile_id, haplogroup) in self._assigned_pairs:
+                return False
+        else:
+            existing = self.db.get_profile_haplogroups(profile_id)
+            for hg in existing:
+                if hg["haplogroup"] == haplogroup:
+                    # Already has this exact haplogroup
+                    return False
+
+        if pending is not None:
+            pending[profile_id] = (profile_id, haplogroup, source)
+        else:
+            # Add the haplogroup (allows multiple haplogroups per profile)
+            self.db.add_haplogroup(
+                profile_id,
+                haplogroup,
+                source,
+                is_tested=(source == "FTDNA" or source == "YFull"),
+                confidence="propagated" if "propagated" in source else "confirmed"
+            )
+        if self._assigned_pairs is not None:
+            self._assigned_pairs.add((profile_id, haplogroup))
         stats["total_propagated"] += 1
         return True
 
@@ -630,26 +1035,9 @@ class YDNAPropagator:
 
         Returns profiles that might connect the two lineages.
         """
-        profiles1 = self.db.get_profiles_by_haplogroup(haplogroup1)
-        profiles2 = self.db.get_profiles_by_haplogroup(haplogroup2)
-
-        # For now, just return profiles with matching surnames
-        surnames1 = set(p.get("last_name", "").lower() for p in profiles1 if p.get("last_name"))
-        surnames2 = set(p.get("last_name", "").lower() for p in profiles2 if p.get("last_name"))
-
-        common_surnames = surnames1.intersection(surnames2)
-
-        connections = []
-        for surname in common_surnames:
-            matching1 = [p for p in profiles1 if p.get("last_name", "").lower() == surname]
-            matching2 = [p for p in profiles2 if p.get("last_name", "").lower() == surname]
-            connections.append({
-                "surname": surname,
-                "haplogroup1_profiles": matching1,
-                "haplogroup2_profiles": matching2
-            })
-
-        return connections
+        # For now, surname matches; the intersection runs as one indexed
+        # SQL query instead of materializing both profile lists here
+        return self.db.find_surname_connections(haplogroup1, haplogroup2)
 
     def get_statistics(self) -> dict:
         """Get propagator statistics."""